@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+import json
+import zlib
+import struct
+import itertools
+import zipfile
+import plistlib
+import argparse
+
+# Only the zip central directory and the few members named below are read; nothing else is decompressed
+MAX_MEMBER_BYTES = 16 * 1024 * 1024  # refuse manifests, plists and icons claiming to be larger than this
+ICON_EXTENSIONS = (".png", ".webp", ".jpg")
+MAX_ICON_PIXELS = 256 * 256  # larger CgBI icons are left to MobSF rather than unfiltered in pure Python
+
+# Binary XML / resource table chunk types (frameworks/base/libs/androidfw/ResourceTypes.h)
+RES_STRING_POOL_TYPE = 0x0001
+RES_TABLE_TYPE = 0x0002
+RES_XML_START_ELEMENT_TYPE = 0x0102
+RES_XML_RESOURCE_MAP_TYPE = 0x0180
+RES_TABLE_PACKAGE_TYPE = 0x0200
+RES_TABLE_TYPE_TYPE = 0x0201
+TYPE_REFERENCE = 0x01
+TYPE_STRING = 0x03
+NO_ENTRY = 0xFFFFFFFF
+
+# android: attribute resource ids, for manifests whose attribute names were stripped
+ATTR_LABEL = 0x01010001
+ATTR_ICON = 0x01010002
+ATTR_VERSION_NAME = 0x0101021C
+
+IPA_INFO_PLIST = re.compile(r"^Payload/[^/]+\.app/Info\.plist$")
+
+def read_member(archive, info):
+    if info.file_size > MAX_MEMBER_BYTES:
+        raise ValueError(f"{info.filename} is {info.file_size} bytes")
+    return archive.read(info)
+
+def read_string_pool(data, offset):
+    _, header_size, _ = struct.unpack_from("<HHI", data, offset)
+    count, _, flags, strings_start = struct.unpack_from("<IIII", data, offset + 8)
+    utf8 = flags & 0x100
+    offsets = struct.unpack_from(f"<{count}I", data, offset + header_size)
+    strings = []
+    for string_offset in offsets:
+        position = offset + strings_start + string_offset
+        if utf8:
+            # UTF-16 length then UTF-8 length, each one or two bytes
+            for _ in range(2):
+                length = data[position]
+                position += 1
+                if length & 0x80:
+                    length = (length & 0x7F) << 8 | data[position]
+                    position += 1
+            strings.append(data[position:position + length].decode("utf-8", "replace"))
+        else:
+            length = struct.unpack_from("<H", data, position)[0]
+            position += 2
+            if length & 0x8000:
+                length = (length & 0x7FFF) << 16 | struct.unpack_from("<H", data, position)[0]
+                position += 2
+            strings.append(data[position:position + length * 2].decode("utf-16-le", "replace"))
+    return strings
+
+def chunks(data, start, end):
+    # (type, offset, header size, size) of each chunk between start and end
+    while start + 8 <= end:
+        chunk_type, header_size, size = struct.unpack_from("<HHI", data, start)
+        if size < 8:
+            return
+        yield chunk_type, start, header_size, size
+        start += size
+
+def manifest_attributes(data):
+    """Attributes of the <manifest> and <application> elements: {element: {name or resource id: value}}."""
+    strings, resource_ids = [], []
+    found = {}
+    for chunk_type, offset, header_size, size in chunks(data, 8, len(data)):
+        if chunk_type == RES_STRING_POOL_TYPE:
+            strings = read_string_pool(data, offset)
+        elif chunk_type == RES_XML_RESOURCE_MAP_TYPE:
+            resource_ids = struct.unpack_from(f"<{(size - header_size) // 4}I", data, offset + header_size)
+        elif chunk_type == RES_XML_START_ELEMENT_TYPE:
+            element = offset + header_size
+            _, name, attribute_start, attribute_size, attribute_count = struct.unpack_from("<IIHHH", data, element)
+            tag = strings[name] if name < len(strings) else ""
+            if tag not in ("manifest", "application"):
+                continue
+            attributes = found.setdefault(tag, {})
+            for index in range(attribute_count):
+                position = element + attribute_start + index * attribute_size
+                _, attr_name, raw, _, _, data_type, value = struct.unpack_from("<IIIHBBI", data, position)
+                if raw != NO_ENTRY and raw < len(strings):
+                    parsed = strings[raw]
+                elif data_type == TYPE_STRING and value < len(strings):
+                    parsed = strings[value]
+                elif data_type == TYPE_REFERENCE:
+                    parsed = ("ref", value)
+                else:
+                    parsed = value
+                if attr_name < len(resource_ids):
+                    attributes[resource_ids[attr_name]] = parsed
+                if attr_name < len(strings):
+                    attributes[strings[attr_name]] = parsed
+            if tag == "application":
+                break
+    return found
+
+def table_values(data, resource_id):
+    """Every configuration's value for resource_id in resources.arsc, as (density, value)."""
+    package_id, type_id, entry_index = resource_id >> 24, (resource_id >> 16) & 0xFF, resource_id & 0xFFFF
+    _, header_size, _ = struct.unpack_from("<HHI", data, 0)
+    strings = []
+    values = []
+    for chunk_type, offset, _, size in chunks(data, header_size, len(data)):
+        if chunk_type == RES_STRING_POOL_TYPE:
+            strings = read_string_pool(data, offset)
+        elif chunk_type == RES_TABLE_PACKAGE_TYPE and struct.unpack_from("<I", data, offset + 8)[0] == package_id:
+            package_header = struct.unpack_from("<H", data, offset + 2)[0]
+            for type_chunk, type_offset, type_header, _ in chunks(data, offset + package_header, offset + size):
+                if type_chunk != RES_TABLE_TYPE_TYPE or data[type_offset + 8] != type_id:
+                    continue
+                value = type_entry(data, type_offset, type_header, entry_index)
+                if value is None:
+                    continue
+                density = struct.unpack_from("<H", data, type_offset + 20 + 14)[0]
+                data_type, raw = value
+                if data_type == TYPE_STRING and raw < len(strings):
+                    values.append((density, strings[raw]))
+                elif data_type == TYPE_REFERENCE:
+                    values.append((density, ("ref", raw)))
+    return values
+
+def type_entry(data, offset, header_size, entry_index):
+    flags = data[offset + 9]
+    entry_count, entries_start = struct.unpack_from("<II", data, offset + 12)
+    index_start = offset + header_size
+    if flags & 0x01:
+        # Sparse: sorted (entry index, offset / 4) pairs
+        for position in range(index_start, index_start + entry_count * 4, 4):
+            index, entry_offset = struct.unpack_from("<HH", data, position)
+            if index == entry_index:
+                break
+        else:
+            return None
+        entry_offset *= 4
+    elif flags & 0x02:
+        # 16-bit offsets / 4
+        if entry_index >= entry_count:
+            return None
+        entry_offset = struct.unpack_from("<H", data, index_start + entry_index * 2)[0]
+        if entry_offset == 0xFFFF:
+            return None
+        entry_offset *= 4
+    else:
+        if entry_index >= entry_count:
+            return None
+        entry_offset = struct.unpack_from("<I", data, index_start + entry_index * 4)[0]
+        if entry_offset == NO_ENTRY:
+            return None
+
+    entry = offset + entries_start + entry_offset
+    size, entry_flags = struct.unpack_from("<HH", data, entry)
+    if entry_flags & 0x0008:
+        # Compact entry: the data type sits in the high byte of the flags
+        return entry_flags >> 8, struct.unpack_from("<I", data, entry + 4)[0]
+    if entry_flags & 0x0001:
+        # A style or other map entry, not a single value
+        return None
+    _, _, data_type, raw = struct.unpack_from("<HBBI", data, entry + size)
+    return data_type, raw
+
+def resolve(table, value, depth=0):
+    # Follows references (e.g. @string/app_name or a mipmap alias); returns [(density, string)]
+    if not isinstance(value, tuple):
+        return [(0, value)] if isinstance(value, str) else []
+    if table is None or depth > 5:
+        return []
+    resolved = []
+    for density, target in table_values(table, value[1]):
+        resolved += [(density, found) for _, found in resolve(table, target, depth + 1)]
+    return resolved
+
+def apk_metadata(archive):
+    manifest = manifest_attributes(read_member(archive, archive.getinfo("AndroidManifest.xml")))
+    try:
+        table = read_member(archive, archive.getinfo("resources.arsc"))
+    except KeyError:
+        table = None
+    application = manifest.get("application", {})
+    package = manifest.get("manifest", {})
+
+    def text(attributes, name, resource_id):
+        value = attributes.get(name, attributes.get(resource_id))
+        # Default configuration (density 0, no locale qualifiers) is listed first in the table
+        candidates = resolve(table, value)
+        return candidates[0][1] if candidates else None
+
+    icon = None
+    icon_value = application.get("icon", application.get(ATTR_ICON))
+    # Highest density bitmap; adaptive icons are XML and have a PNG fallback per density
+    bitmaps = [(density, path) for density, path in resolve(table, icon_value)
+               if path.lower().endswith(ICON_EXTENSIONS)]
+    if bitmaps:
+        icon = max(bitmaps, key=lambda item: item[0] if item[0] < 0xFFFE else 0)[1]
+    return {
+        "platform": "Android",
+        "bundle_id": package.get("package") if isinstance(package.get("package"), str) else None,
+        "version": text(package, "versionName", ATTR_VERSION_NAME),
+        "app_name": text(application, "label", ATTR_LABEL),
+        "icon_member": icon,
+    }
+
+def ipa_icon_names(plist):
+    names = []
+    for key in ("CFBundleIcons", "CFBundleIcons~ipad"):
+        names += plist.get(key, {}).get("CFBundlePrimaryIcon", {}).get("CFBundleIconFiles", [])
+    names += plist.get("CFBundleIconFiles", [])
+    if plist.get("CFBundleIconFile"):
+        names.append(plist["CFBundleIconFile"])
+    return [os.path.splitext(name)[0] for name in names if isinstance(name, str)]
+
+def ipa_metadata(archive):
+    plist_info = next((info for info in archive.infolist() if IPA_INFO_PLIST.match(info.filename)), None)
+    if plist_info is None:
+        raise KeyError("Payload/*.app/Info.plist")
+    plist = plistlib.loads(read_member(archive, plist_info))
+    app_dir = plist_info.filename[:-len("Info.plist")]
+
+    # AppIcon60x60@2x.png, AppIcon76x76@2x~ipad.png ...; the largest file is the highest resolution
+    names = ipa_icon_names(plist)
+    icons = [info for info in archive.infolist()
+             if info.filename.startswith(app_dir) and "/" not in info.filename[len(app_dir):]
+             and info.filename.lower().endswith(".png")
+             and any(info.filename[len(app_dir):].startswith(name) for name in names)]
+    icon = max(icons, key=lambda info: info.file_size).filename if icons else None
+    return {
+        "platform": "iOS",
+        "bundle_id": plist.get("CFBundleIdentifier"),
+        "version": plist.get("CFBundleShortVersionString") or plist.get("CFBundleVersion"),
+        "app_name": plist.get("CFBundleDisplayName") or plist.get("CFBundleName"),
+        "icon_member": icon,
+    }
+
+def paeth(a, b, c):
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    return b if pb <= pc else c
+
+def uncrush_png(data):
+    """Turn an Xcode-optimised (CgBI) PNG back into one browsers can show; other PNGs pass through.
+
+    Raises ValueError for a CgBI PNG that is malformed or over MAX_ICON_PIXELS.
+    """
+    if data[:8] != b"\x89PNG\r\n\x1a\n" or data[12:16] != b"CgBI":
+        return data
+    position = 8
+    parts = []
+    idat = []
+    width = height = None
+    while position < len(data):
+        length, chunk_type = struct.unpack_from(">I4s", data, position)
+        body = data[position + 8:position + 8 + length]
+        position += 12 + length
+        if chunk_type == b"IHDR":
+            width, height, bit_depth, color_type = struct.unpack_from(">IIBB", body)
+            if (bit_depth, color_type) != (8, 6):
+                return data
+            parts.append((chunk_type, body))
+        elif chunk_type == b"IDAT":
+            idat.append(body)
+        elif chunk_type == b"IEND":
+            break
+        elif chunk_type != b"CgBI":
+            parts.append((chunk_type, body))
+    if not width or not height:
+        raise ValueError("CgBI PNG without a usable IHDR chunk")
+    if width * height > MAX_ICON_PIXELS:
+        raise ValueError(f"CgBI PNG of {width}x{height} pixels is over the {MAX_ICON_PIXELS} pixel limit")
+
+    # Raw deflate without a zlib header, BGRA with premultiplied alpha; never inflate past the image's own size
+    stride = width * 4
+    size = height * (stride + 1)
+    raw = zlib.decompressobj(-15).decompress(b"".join(idat), size)
+    if len(raw) < size:
+        raise ValueError("CgBI PNG image data is truncated")
+    previous = bytearray(stride)
+    pixels = bytearray()
+    for row in range(height):
+        start = row * (stride + 1)
+        filter_type = raw[start]
+        line = bytearray(raw[start + 1:start + 1 + stride])
+        if filter_type > 4:
+            raise ValueError(f"CgBI PNG row {row} has unknown filter type {filter_type}")
+        if filter_type == 1:
+            for channel in range(4):
+                line[channel::4] = bytes(itertools.accumulate(line[channel::4], lambda left, value: (left + value) & 0xFF))
+        elif filter_type == 2:
+            line = bytearray((value + up) & 0xFF for value, up in zip(line, previous))
+        elif filter_type:
+            for i in range(stride):
+                left = line[i - 4] if i >= 4 else 0
+                up = previous[i]
+                if filter_type == 3:
+                    line[i] = (line[i] + ((left + up) >> 1)) & 0xFF
+                else:
+                    line[i] = (line[i] + paeth(left, up, previous[i - 4] if i >= 4 else 0)) & 0xFF
+        pixels += line
+        previous = line
+
+    pixels[0::4], pixels[2::4] = pixels[2::4], pixels[0::4]
+    # App icons are normally opaque, so only partly transparent pixels need un-premultiplying
+    for pixel in range(3, len(pixels), 4):
+        alpha = pixels[pixel]
+        if 0 < alpha < 255:
+            for channel in range(pixel - 3, pixel):
+                pixels[channel] = min(pixels[channel] * 255 // alpha, 255)
+
+    # Filter type 0 on every row, zlib-wrapped like any other PNG
+    rows = b"".join(b"\x00" + bytes(pixels[row * stride:(row + 1) * stride]) for row in range(height))
+    output = bytearray(b"\x89PNG\r\n\x1a\n")
+    for chunk_type, body in parts[:1] + [(b"IDAT", zlib.compress(rows, 9))] + parts[1:] + [(b"IEND", b"")]:
+        output += struct.pack(">I", len(body)) + chunk_type + body
+        output += struct.pack(">I", zlib.crc32(chunk_type + body) & 0xFFFFFFFF)
+    return bytes(output)
+
+def read_metadata(path, with_icon=True):
+    """Bundle id, version, name and icon read straight from an APK or IPA, without uploading it.
+
+    Returns a dict with platform, bundle_id, version, app_name, icon (bytes or None) and
+    icon_extension; fields the archive does not declare are None. Raises ValueError if the
+    file is not a readable APK/IPA.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        with zipfile.ZipFile(path) as archive:
+            metadata = apk_metadata(archive) if extension == ".apk" else ipa_metadata(archive)
+            member = metadata.pop("icon_member")
+            metadata["icon"] = None
+            metadata["icon_extension"] = None
+            if with_icon and member:
+                icon = read_member(archive, archive.getinfo(member))
+                if extension == ".ipa":
+                    # An icon this cannot decode is left to MobSF; it must not fail the app's metadata
+                    try:
+                        icon = uncrush_png(icon)
+                    except (ValueError, TypeError, IndexError, struct.error, zlib.error):
+                        icon = None
+                if icon:
+                    metadata["icon"] = icon
+                    metadata["icon_extension"] = os.path.splitext(member)[1].lower()
+    except (zipfile.BadZipFile, KeyError, struct.error, IndexError, ValueError, plistlib.InvalidFileException,
+            zlib.error, AttributeError, OSError) as e:
+        raise ValueError(f"Cannot read app metadata from {path}: {e}") from e
+    for field in ("bundle_id", "version", "app_name"):
+        if not isinstance(metadata[field], str) or not metadata[field]:
+            metadata[field] = None
+    return metadata
+
+def main():
+    parser = argparse.ArgumentParser(description="Print the bundle id, version, name and icon of APK/IPA files")
+    parser.add_argument("files", nargs="+", help="APK or IPA files")
+    parser.add_argument("--icon-dir", help="Also write each extracted icon into this folder")
+
+    args = parser.parse_args()
+
+    failed = False
+    for path in args.files:
+        try:
+            metadata = read_metadata(path)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            failed = True
+            continue
+        icon = metadata.pop("icon")
+        if icon and args.icon_dir:
+            os.makedirs(args.icon_dir, exist_ok=True)
+            icon_path = os.path.join(args.icon_dir, os.path.splitext(os.path.basename(path))[0] + metadata["icon_extension"])
+            with open(icon_path, "wb") as f:
+                f.write(icon)
+            metadata["icon_path"] = icon_path
+        metadata["icon_bytes"] = len(icon) if icon else 0
+        print(json.dumps(dict(metadata, file=path), ensure_ascii=False))
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
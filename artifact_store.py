@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+import os
+import shutil
+import sqlite3
+import hashlib
+import argparse
+import tempfile
+import time
+
+# Configuration
+DB_PATH = "mobsf_scans.db"
+REPORTS_BASE_DIR = "./mobsf_reports"
+OBJECTS_DIR = os.path.join(REPORTS_BASE_DIR, "objects")
+HASH_CHUNK_SIZE = 1024 * 1024
+GC_MIN_AGE = 3600  # seconds; younger objects may belong to a scan that has not been stored yet
+
+# Every column that holds a path to an icon or PDF
+ARTIFACT_COLUMNS = [
+    ("scans", "icon_path"),
+    ("scans", "pdf_path"),
+    ("scan_cache", "icon_path"),
+    ("scan_cache", "pdf_path"),
+    ("latest_scans", "icon_path"),
+]
+
+def object_path(digest, extension):
+    # Fanned out by the first two hex digits so no directory grows past a few thousand entries
+    return os.path.join(OBJECTS_DIR, digest[:2], digest + extension.lower())
+
+def commit_object(tmp_path, digest, extension):
+    path = object_path(digest, extension)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        # Identical content is already stored; touch it so gc sees it as in use
+        os.remove(tmp_path)
+        os.utime(path)
+    else:
+        os.replace(tmp_path, path)
+    return path
+
+def store_chunks(chunks, extension):
+    """Write chunks to the store under their sha256; returns (path, bytes written)."""
+    os.makedirs(OBJECTS_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=OBJECTS_DIR, prefix=".", suffix=".part")
+    digest = hashlib.sha256()
+    written = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                digest.update(chunk)
+                written += len(chunk)
+        return commit_object(tmp_path, digest.hexdigest(), extension), written
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def store_file(src):
+    # Hard link an existing file into the store when possible, so converting costs no copy
+    digest = hashlib.sha256()
+    with open(src, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    os.makedirs(OBJECTS_DIR, exist_ok=True)
+    tmp_path = os.path.join(OBJECTS_DIR, f".{os.getpid()}.{os.path.basename(src)}.part")
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        shutil.copy2(src, tmp_path)
+    return commit_object(tmp_path, digest.hexdigest(), os.path.splitext(src)[1])
+
+def existing_columns(conn):
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return [(table, column) for table, column in ARTIFACT_COLUMNS if table in tables]
+
+def batch_artifacts():
+    # Files written by scan.py before the store: mobsf_reports/batch_<id>/{icons,reports}/*
+    if not os.path.isdir(REPORTS_BASE_DIR):
+        return
+    for batch in sorted(os.listdir(REPORTS_BASE_DIR)):
+        for kind in ("icons", "reports"):
+            folder = os.path.join(REPORTS_BASE_DIR, batch, kind)
+            if batch.startswith("batch_") and os.path.isdir(folder):
+                for name in sorted(os.listdir(folder)):
+                    path = os.path.join(folder, name)
+                    if os.path.isfile(path) and not name.startswith("."):
+                        yield path
+
+def migrate(db_path, dry_run=False, keep_originals=False):
+    """Move pre-store batch files into the store; returns (files, objects, rows updated)."""
+    originals = list(batch_artifacts())
+    moved = {os.path.normpath(path): None if dry_run else store_file(path) for path in originals}
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    updated = 0
+    try:
+        # Point every row at the store in one transaction, before any original is removed
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table, column in existing_columns(conn):
+                for (value,) in conn.execute(f"SELECT DISTINCT {column} FROM {table} WHERE {column} IS NOT NULL").fetchall():
+                    if os.path.normpath(value) not in moved:
+                        continue
+                    updated += conn.execute(f"UPDATE {table} SET {column} = ? WHERE {column} = ?",
+                                            (moved[os.path.normpath(value)], value)).rowcount
+            conn.execute("ROLLBACK" if dry_run else "COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+    if not dry_run and not keep_originals:
+        for path in originals:
+            os.remove(path)
+        for folder in {os.path.dirname(path) for path in originals}:
+            if not os.listdir(folder):
+                os.rmdir(folder)
+    return len(originals), len(set(moved.values())) if not dry_run else 0, updated
+
+def referenced_paths(conn):
+    paths = set()
+    for table, column in existing_columns(conn):
+        for (value,) in conn.execute(f"SELECT DISTINCT {column} FROM {table} WHERE {column} IS NOT NULL AND {column} != ''"):
+            paths.add(os.path.normpath(value))
+    return paths
+
+def gc(db_path, dry_run=False, min_age=GC_MIN_AGE):
+    """Delete stored objects no row refers to any more; returns (files, bytes)."""
+    conn = sqlite3.connect(db_path)
+    try:
+        referenced = referenced_paths(conn)
+    finally:
+        conn.close()
+
+    removed = freed = 0
+    cutoff = time.time() - min_age
+    if not os.path.isdir(OBJECTS_DIR):
+        return removed, freed
+    for root, _, names in os.walk(OBJECTS_DIR):
+        for name in names:
+            if name.startswith("."):
+                continue
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            if os.path.normpath(path) in referenced or stat.st_mtime > cutoff:
+                continue
+            removed += 1
+            freed += stat.st_size
+            if not dry_run:
+                os.remove(path)
+    return removed, freed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Content-addressed store for MobSF icons and PDF reports")
+    parser.add_argument("--db", default=DB_PATH, help=f"Path to the SQLite database (default: {DB_PATH})")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without touching anything")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = subparsers.add_parser("migrate", help="Move batch_<id>/icons and reports into the store")
+    migrate_parser.add_argument("--keep-originals", action="store_true",
+                                help="Leave the old batch files in place after the database is updated")
+    gc_parser = subparsers.add_parser("gc", help="Delete stored objects that no scan refers to")
+    gc_parser.add_argument("--min-age", type=int, default=GC_MIN_AGE,
+                           help=f"Only delete objects older than this many seconds (default: {GC_MIN_AGE})")
+
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        files, unique, updated = migrate(args.db, args.dry_run, args.keep_originals)
+        if args.dry_run:
+            print(f"Would move {files} files into {OBJECTS_DIR} and update {updated} database paths.")
+        else:
+            print(f"Moved {files} files into {unique} stored objects and updated {updated} database paths.")
+    else:
+        removed, freed = gc(args.db, args.dry_run, args.min_age)
+        action = "Would remove" if args.dry_run else "Removed"
+        print(f"{action} {removed} unreferenced objects ({freed / 1024 / 1024:.1f} MB).")
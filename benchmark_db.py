@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+import os
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import statistics
+import threading
+
+from db_migrate import BASE_SCHEMA, enable_wal, migrate
+from scan import DBWriter
+
+INSERT_SCAN = """
+INSERT INTO scans (
+    batch_id, app_name, bundle_id, version, platform,
+    security_score, high_findings, warning_findings,
+    info_findings, secure_findings, icon_path, pdf_path
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# The SQL the dashboard API routes run, with a parameter picker for each
+DASHBOARD_QUERIES = [
+    ("dashboard-data", """
+        SELECT
+          b.id as batchId,
+          b.batch_date as batchDate,
+          SUM(s.high_findings) as highRisk,
+          SUM(s.warning_findings) as mediumRisk,
+          SUM(s.info_findings) as lowRisk,
+          AVG(s.security_score) as avgScore,
+          SUM(CASE WHEN s.platform = 'Android' THEN s.high_findings ELSE 0 END) as androidHighRisk,
+          SUM(CASE WHEN s.platform = 'iOS' THEN s.high_findings ELSE 0 END) as iosHighRisk
+        FROM batches b
+        JOIN scans s ON b.id = s.batch_id
+        GROUP BY b.id
+        ORDER BY b.created_at
+    """, lambda db: ()),
+    ("apps/inventory", """
+        WITH RankedScans AS (
+          SELECT
+            s.*,
+            b.batch_date,
+            ROW_NUMBER() OVER (
+              PARTITION BY s.bundle_id
+              ORDER BY b.batch_date DESC, s.id DESC
+            ) as rn
+          FROM scans s
+          JOIN batches b ON s.batch_id = b.id
+        )
+        SELECT app_name, bundle_id, platform, security_score, high_findings,
+               warning_findings, info_findings, batch_id, batch_date, icon_path
+        FROM RankedScans
+        WHERE rn = 1
+        ORDER BY app_name ASC
+    """, lambda db: ()),
+    ("batches/[id]", "SELECT * FROM scans WHERE batch_id = ?",
+     lambda db: (random_batch_id(db),)),
+    ("apps/[bundleId] current", """
+        SELECT s.*, b.batch_date
+        FROM scans s
+        JOIN batches b ON s.batch_id = b.id
+        WHERE s.bundle_id = ? AND s.batch_id = ?
+    """, lambda db: (random_bundle_id(db), random_batch_id(db))),
+    ("apps/[bundleId] history", """
+        SELECT s.security_score, s.high_findings, s.warning_findings, s.info_findings, b.batch_date
+        FROM scans s
+        JOIN batches b ON s.batch_id = b.id
+        WHERE s.bundle_id = ?
+        ORDER BY b.batch_date ASC
+    """, lambda db: (random_bundle_id(db),)),
+]
+
+# What dashboard-data and apps/inventory run once the rollup tables exist (schema version 9)
+ROLLUP_QUERIES = [
+    ("dashboard-data rollup", """
+        SELECT
+          b.id as batchId,
+          b.batch_date as batchDate,
+          r.high_findings as highRisk,
+          r.warning_findings as mediumRisk,
+          r.info_findings as lowRisk,
+          CAST(r.score_total AS REAL) / NULLIF(r.scored_count, 0) as avgScore,
+          r.android_high_findings as androidHighRisk,
+          r.ios_high_findings as iosHighRisk
+        FROM batches b
+        JOIN batch_summary r ON b.id = r.batch_id
+        ORDER BY b.created_at
+    """, lambda db: ()),
+    ("apps/inventory rollup", """
+        SELECT app_name, bundle_id, platform, security_score, high_findings,
+               warning_findings, info_findings, batch_id, batch_date, icon_path
+        FROM latest_scans
+        ORDER BY app_name ASC
+    """, lambda db: ()),
+]
+
+# The SQL the dashboard API routes run today, checked by --db against a generated or production database
+CURRENT_QUERIES = ROLLUP_QUERIES + [
+    ("batches", "SELECT * FROM batches ORDER BY id DESC", lambda db: ()),
+    ("batches/[id] batch", "SELECT * FROM batches WHERE id = ?", lambda db: (random_batch_id(db),)),
+] + DASHBOARD_QUERIES[2:]
+
+def random_batch_id(db):
+    return db.execute("SELECT id FROM batches ORDER BY RANDOM() LIMIT 1").fetchone()[0]
+
+def random_bundle_id(db):
+    return db.execute("SELECT bundle_id FROM scans WHERE id = ?",
+                      (random.randint(1, db.execute("SELECT MAX(id) FROM scans").fetchone()[0]),)).fetchone()[0]
+
+def scan_row(batch_id, app):
+    return (batch_id, f"App {app}", f"com.example.app{app}.apk", "1.0", random.choice(["Android", "iOS"]),
+            random.randint(30, 70), random.randint(0, 8), random.randint(0, 25),
+            random.randint(0, 5), random.randint(0, 4),
+            f"./mobsf_reports/batch_{batch_id}/icons/app{app}_icon.png",
+            f"./mobsf_reports/batch_{batch_id}/reports/app{app}.pdf")
+
+def build_db(db_path, num_batches, num_apps):
+    conn = sqlite3.connect(db_path)
+    for statement in BASE_SCHEMA:
+        conn.execute(statement)
+    for batch in range(num_batches):
+        year, month = divmod(batch, 12)
+        batch_id = conn.execute("INSERT INTO batches (batch_date) VALUES (?)",
+                                (f"{2015 + year}-{month + 1:02d}",)).lastrowid
+        conn.executemany(INSERT_SCAN, (scan_row(batch_id, app) for app in range(num_apps)))
+    conn.commit()
+    conn.close()
+
+def query_report(db_path, repeats, queries=CURRENT_QUERIES):
+    """Median and worst latency, rows returned and EXPLAIN QUERY PLAN for each query."""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    report = []
+    for name, query, params in queries:
+        timings = []
+        rows = 0
+        for _ in range(repeats):
+            values = params(conn)
+            start = time.perf_counter()
+            rows = len(conn.execute(query, values).fetchall())
+            timings.append((time.perf_counter() - start) * 1000)
+        plan = [detail for _, _, _, detail in conn.execute(f"EXPLAIN QUERY PLAN {query}", params(conn))]
+        report.append((name, statistics.median(timings), max(timings), rows, plan))
+    conn.close()
+    return report
+
+def print_query_report(db_path, repeats):
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    scans, bundles, batches = conn.execute(
+        "SELECT COUNT(*), COUNT(DISTINCT bundle_id), COUNT(DISTINCT batch_id) FROM scans").fetchone()
+    conn.close()
+    print(f"{db_path}: {scans} scans, {bundles} bundle ids, {batches} batches\n")
+    print(f"{'query':<28}{'median ms':>12}{'max ms':>12}{'rows':>10}")
+    for name, median, worst, rows, plan in query_report(db_path, repeats):
+        print(f"{name:<28}{median:>12.2f}{worst:>12.2f}{rows:>10}")
+        for detail in plan:
+            # A SCAN without an index reads the whole table on every request
+            flag = "  <- full scan" if detail.startswith("SCAN") and "INDEX" not in detail else ""
+            print(f"    {detail}{flag}")
+
+def time_queries(db_path, repeats, queries=DASHBOARD_QUERIES):
+    conn = sqlite3.connect(db_path)
+    results = {}
+    for name, query, params in queries:
+        timings = []
+        for _ in range(repeats):
+            values = params(conn)
+            start = time.perf_counter()
+            conn.execute(query, values).fetchall()
+            timings.append((time.perf_counter() - start) * 1000)
+        results[name] = statistics.median(timings)
+    conn.close()
+    return results
+
+def insert_per_connection(db_path, count, batch_id):
+    # How scan.py wrote before: a fresh connection and commit per statement
+    start = time.perf_counter()
+    for app in range(count):
+        conn = sqlite3.connect(db_path)
+        conn.execute(INSERT_SCAN, scan_row(batch_id, app))
+        conn.commit()
+        conn.close()
+    return count / (time.perf_counter() - start)
+
+def insert_with_writer(db_path, count, batch_id, threads):
+    # Several workers submitting through one DBWriter, as scan.py --workers does now
+    writer = DBWriter(db_path)
+    per_thread = count // threads
+
+    def worker(offset):
+        for app in range(offset, offset + per_thread):
+            writer.submit(lambda conn, app=app: conn.execute(INSERT_SCAN, scan_row(batch_id, app)))
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(n * per_thread,)) for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    writer.close()
+    return per_thread * threads / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scan inserts and dashboard queries before and after the WAL/index migration")
+    parser.add_argument("--batches", type=int, default=120, help="Synthetic monthly batches (default: 120)")
+    parser.add_argument("--apps", type=int, default=500, help="Scans per batch (default: 500)")
+    parser.add_argument("--inserts", type=int, default=2000, help="Rows inserted per write benchmark (default: 2000)")
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent writers for the DBWriter benchmark (default: 8)")
+    parser.add_argument("--repeats", type=int, default=5, help="Runs per query, median reported (default: 5)")
+    parser.add_argument("--db", help="Only time the current dashboard queries against this database, with their "
+                                     "query plans (e.g. one built by mobsf_dummy_data.py --scale)")
+
+    args = parser.parse_args()
+
+    if args.db:
+        print_query_report(args.db, args.repeats)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        start = time.perf_counter()
+        build_db(db_path, args.batches, args.apps)
+        print(f"Built {args.batches * args.apps} scans in {args.batches} batches in {time.perf_counter() - start:.1f}s")
+
+        before_queries = time_queries(db_path, args.repeats)
+        before_inserts = insert_per_connection(db_path, args.inserts, 1)
+
+        conn = sqlite3.connect(db_path, isolation_level=None)
+        enable_wal(conn)
+        migrate(conn)
+        conn.close()
+
+        after_queries = time_queries(db_path, args.repeats)
+        rollup_queries = time_queries(db_path, args.repeats, ROLLUP_QUERIES)
+        after_inserts = insert_with_writer(db_path, args.inserts, 1, args.threads)
+
+    print(f"\n{'query':<28}{'before ms':>12}{'after ms':>12}")
+    for name, _, _ in DASHBOARD_QUERIES:
+        print(f"{name:<28}{before_queries[name]:>12.2f}{after_queries[name]:>12.2f}")
+    for name, _, _ in ROLLUP_QUERIES:
+        print(f"{name:<28}{'':>12}{rollup_queries[name]:>12.2f}")
+    print(f"\n{'inserts/s, connect per row':<28}{before_inserts:>12.0f}")
+    print(f"{f'inserts/s, DBWriter x{args.threads}':<28}{after_inserts:>12.0f}")
+
+if __name__ == "__main__":
+    main()
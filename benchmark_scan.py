@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import resource
+import tempfile
+import subprocess
+from collections import defaultdict
+
+from benchmark_db import BASE_SCHEMA
+from fake_mobsf import start_server, DEFAULT_CONFIG
+
+SCAN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scan.py")
+STAGE_LINE = re.compile(r"Finished stage (\w+) in ([\d.]+)s")
+
+def make_apps(scan_dir, count, min_mb, max_mb):
+    os.makedirs(scan_dir)
+    total = 0
+    sizes = []
+    for n in range(count):
+        size = int(random.uniform(min_mb, max_mb) * 1024 * 1024)
+        extension = "apk" if n % 2 == 0 else "ipa"
+        with open(os.path.join(scan_dir, f"Bench_App_{n:03d}.{extension}"), "wb") as f:
+            # A zip local-file signature up front, random bytes after
+            f.write(b"PK\x03\x04")
+            remaining = size
+            while remaining > 0:
+                chunk = min(remaining, 1024 * 1024)
+                f.write(os.urandom(chunk))
+                remaining -= chunk
+        total += size
+        sizes.append(size)
+    return total, sizes
+
+def make_db(db_path):
+    conn = sqlite3.connect(db_path)
+    for statement in BASE_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+    conn.close()
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+def ideal_makespan(sizes, config, workers):
+    # The fake server's analysis times packed longest-first onto the workers: what a healthy run can't beat
+    durations = sorted((config["scan_seconds"] + size / 1024 / 1024 * config["scan_seconds_per_mb"] for size in sizes),
+                       reverse=True)
+    loads = [0.0] * max(workers, 1)
+    for duration in durations:
+        loads[loads.index(min(loads))] += duration
+    return max(loads)
+
+def scan_workers(scan_args):
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--pipeline", action="store_true")
+    parser.add_argument("--stage-workers", action="append", default=[])
+    known, _ = parser.parse_known_args(scan_args)
+    if not known.pipeline:
+        return known.workers
+    workers = 2  # scan.py's default scan stage concurrency
+    for spec in known.stage_workers:
+        stage, _, count = spec.partition("=")
+        if stage == "scan":
+            workers = int(count)
+    return workers
+
+def stage_timings(log_path):
+    timings = defaultdict(list)
+    with open(log_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            match = STAGE_LINE.match(record.get("message", ""))
+            if match:
+                timings[match.group(1)].append(float(match.group(2)))
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run scan.py against a fake MobSF and report throughput",
+        epilog="Arguments after -- are passed to scan.py, e.g. -- --workers 4 or -- --pipeline"
+    )
+    parser.add_argument("--apps", type=int, default=20, help="Number of synthetic APK/IPA files (default: 20)")
+    parser.add_argument("--min-mb", type=float, default=1.0, help="Smallest synthetic app in MB (default: 1)")
+    parser.add_argument("--max-mb", type=float, default=20.0, help="Largest synthetic app in MB (default: 20)")
+    parser.add_argument("--latency", type=float, default=DEFAULT_CONFIG["latency"])
+    parser.add_argument("--scan-seconds", type=float, default=DEFAULT_CONFIG["scan_seconds"])
+    parser.add_argument("--scan-seconds-per-mb", type=float, default=DEFAULT_CONFIG["scan_seconds_per_mb"])
+    parser.add_argument("--failure-rate", type=float, default=DEFAULT_CONFIG["failure_rate"])
+    parser.add_argument("--pdf-size", type=int, default=DEFAULT_CONFIG["pdf_size"])
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for app sizes (default: 1)")
+    parser.add_argument("--max-slowdown", type=float, metavar="FACTOR",
+                        help="Exit 1 if the run takes more than FACTOR times the ideal makespan, "
+                             "e.g. --failure-rate 0 --max-slowdown 1.5 as a regression check against a healthy MobSF")
+    parser.add_argument("--keep", action="store_true", help="Keep the working directory for inspection")
+    parser.add_argument("scan_args", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+    scan_args = [arg for arg in args.scan_args if arg != "--"]
+    random.seed(args.seed)
+
+    server, url = start_server(
+        latency=args.latency,
+        scan_seconds=args.scan_seconds,
+        scan_seconds_per_mb=args.scan_seconds_per_mb,
+        failure_rate=args.failure_rate,
+        pdf_size=args.pdf_size,
+    )
+    config = server.mobsf.config
+
+    workdir = tempfile.mkdtemp(prefix="mobsf_bench_")
+    total_bytes, sizes = make_apps(os.path.join(workdir, "mobile_apps"), args.apps, args.min_mb, args.max_mb)
+    make_db(os.path.join(workdir, "mobsf_scans.db"))
+    print(f"Generated {args.apps} apps ({total_bytes / 1024 / 1024:.0f} MB) in {workdir}")
+
+    command = [
+        sys.executable, SCAN_SCRIPT, url, config["api_key"], config["username"], config["password"],
+        "--rescan", "--log-level", "DEBUG", "--log-format", "json", "--log-max-bytes", str(1024 ** 3),
+    ] + scan_args
+    print(f"Running: scan.py {' '.join(command[6:])}")
+
+    started = time.monotonic()
+    result = subprocess.run(command, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    elapsed = time.monotonic() - started
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    server.shutdown()
+
+    conn = sqlite3.connect(os.path.join(workdir, "mobsf_scans.db"))
+    stored = conn.execute("SELECT COUNT(*) FROM scans").fetchone()[0]
+    conn.close()
+
+    print(f"\nscan.py exit code {result.returncode}, {stored}/{args.apps} apps stored in {elapsed:.1f}s")
+    if result.returncode not in (0, 4, 5):
+        print(result.stderr)
+    print(f"Throughput: {stored / elapsed * 60:.1f} apps/min, {total_bytes / 1024 / 1024 / elapsed:.1f} MB/s uploaded")
+    print(f"Peak RSS: {peak_rss_mb:.0f} MB")
+    workers = scan_workers(scan_args)
+    ideal = ideal_makespan(sizes, config, workers)
+    print(f"Ideal makespan on {workers} workers: {ideal:.1f}s, run took {elapsed / ideal:.2f}x that")
+
+    timings = stage_timings(os.path.join(workdir, "mobsf_scans.log"))
+    print(f"\n{'stage':<12}{'count':>8}{'p50 s':>10}{'p95 s':>10}")
+    for stage, values in timings.items():
+        print(f"{stage:<12}{len(values):>8}{percentile(values, 0.5):>10.3f}{percentile(values, 0.95):>10.3f}")
+
+    if args.keep:
+        print(f"\nWorking directory kept at {workdir}")
+    else:
+        shutil.rmtree(workdir)
+
+    if args.max_slowdown and (stored < args.apps or elapsed > ideal * args.max_slowdown):
+        print(f"\nFAIL: expected all {args.apps} apps stored within {ideal * args.max_slowdown:.1f}s")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+import sqlite3
+import argparse
+
+# Configuration
+DB_PATH = "mobsf_scans.db"
+
+# Schema of mobsf_scans.db before any migrations, for building a database from scratch
+BASE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS batches (
+        id INTEGER PRIMARY KEY,
+        batch_date TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS scans (
+        id INTEGER PRIMARY KEY,
+        batch_id INTEGER,
+        scan_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        app_name TEXT,
+        bundle_id TEXT,
+        version TEXT,
+        platform TEXT,
+        security_score INTEGER,
+        high_findings INTEGER,
+        warning_findings INTEGER,
+        info_findings INTEGER,
+        secure_findings INTEGER,
+        icon_path TEXT,
+        pdf_path TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (batch_id) REFERENCES batches(id)
+    )
+    """,
+]
+
+# Recomputes the dashboard rollups from scans; used by migration 9 and db_migrate.py --rebuild-rollups
+ROLLUP_REBUILD = [
+    "DELETE FROM batch_summary",
+    """
+    INSERT INTO batch_summary (
+        batch_id, scan_count, high_findings, warning_findings, info_findings,
+        secure_findings, score_total, scored_count, android_high_findings, ios_high_findings
+    )
+    SELECT
+        batch_id, COUNT(*), TOTAL(high_findings), TOTAL(warning_findings), TOTAL(info_findings),
+        TOTAL(secure_findings), TOTAL(security_score), COUNT(security_score),
+        TOTAL(CASE WHEN platform = 'Android' THEN high_findings ELSE 0 END),
+        TOTAL(CASE WHEN platform = 'iOS' THEN high_findings ELSE 0 END)
+    FROM scans
+    WHERE batch_id IS NOT NULL
+    GROUP BY batch_id
+    """,
+    "DELETE FROM latest_scans",
+    """
+    INSERT INTO latest_scans (
+        bundle_id, scan_id, batch_id, batch_date, app_name, platform,
+        security_score, high_findings, warning_findings, info_findings, icon_path
+    )
+    SELECT
+        bundle_id, id, batch_id, batch_date, app_name, platform,
+        security_score, high_findings, warning_findings, info_findings, icon_path
+    FROM (
+        SELECT s.*, b.batch_date, ROW_NUMBER() OVER (
+            PARTITION BY s.bundle_id
+            ORDER BY b.batch_date DESC, s.id DESC
+        ) AS rn
+        FROM scans s
+        JOIN batches b ON s.batch_id = b.id
+    )
+    WHERE rn = 1
+    """,
+]
+
+# Folds one newly inserted scan (by id) into the rollups
+ROLLUP_UPDATE = [
+    """
+    INSERT INTO batch_summary (
+        batch_id, scan_count, high_findings, warning_findings, info_findings,
+        secure_findings, score_total, scored_count, android_high_findings, ios_high_findings
+    )
+    SELECT
+        batch_id, 1, COALESCE(high_findings, 0), COALESCE(warning_findings, 0), COALESCE(info_findings, 0),
+        COALESCE(secure_findings, 0), COALESCE(security_score, 0), security_score IS NOT NULL,
+        CASE WHEN platform = 'Android' THEN COALESCE(high_findings, 0) ELSE 0 END,
+        CASE WHEN platform = 'iOS' THEN COALESCE(high_findings, 0) ELSE 0 END
+    FROM scans
+    WHERE id = ? AND batch_id IS NOT NULL
+    ON CONFLICT (batch_id) DO UPDATE SET
+        scan_count = scan_count + excluded.scan_count,
+        high_findings = high_findings + excluded.high_findings,
+        warning_findings = warning_findings + excluded.warning_findings,
+        info_findings = info_findings + excluded.info_findings,
+        secure_findings = secure_findings + excluded.secure_findings,
+        score_total = score_total + excluded.score_total,
+        scored_count = scored_count + excluded.scored_count,
+        android_high_findings = android_high_findings + excluded.android_high_findings,
+        ios_high_findings = ios_high_findings + excluded.ios_high_findings
+    """,
+    """
+    INSERT INTO latest_scans (
+        bundle_id, scan_id, batch_id, batch_date, app_name, platform,
+        security_score, high_findings, warning_findings, info_findings, icon_path
+    )
+    SELECT
+        s.bundle_id, s.id, s.batch_id, b.batch_date, s.app_name, s.platform,
+        s.security_score, s.high_findings, s.warning_findings, s.info_findings, s.icon_path
+    FROM scans s
+    JOIN batches b ON s.batch_id = b.id
+    WHERE s.id = ?
+    ON CONFLICT (bundle_id) DO UPDATE SET
+        scan_id = excluded.scan_id,
+        batch_id = excluded.batch_id,
+        batch_date = excluded.batch_date,
+        app_name = excluded.app_name,
+        platform = excluded.platform,
+        security_score = excluded.security_score,
+        high_findings = excluded.high_findings,
+        warning_findings = excluded.warning_findings,
+        info_findings = excluded.info_findings,
+        icon_path = excluded.icon_path
+    WHERE (excluded.batch_date, excluded.scan_id) > (latest_scans.batch_date, latest_scans.scan_id)
+    """,
+]
+
+# Re-picks the latest scan for one bundle_id after scans have been deleted
+ROLLUP_REFRESH_BUNDLE = [
+    "DELETE FROM latest_scans WHERE bundle_id = ?",
+    """
+    INSERT INTO latest_scans (
+        bundle_id, scan_id, batch_id, batch_date, app_name, platform,
+        security_score, high_findings, warning_findings, info_findings, icon_path
+    )
+    SELECT
+        s.bundle_id, s.id, s.batch_id, b.batch_date, s.app_name, s.platform,
+        s.security_score, s.high_findings, s.warning_findings, s.info_findings, s.icon_path
+    FROM scans s
+    JOIN batches b ON s.batch_id = b.id
+    WHERE s.bundle_id = ?
+    ORDER BY b.batch_date DESC, s.id DESC
+    LIMIT 1
+    """,
+]
+
+# Each entry is one schema version; PRAGMA user_version records how many have been applied
+MIGRATIONS = [
+    # 1: content-hash cache used by scan.py to skip re-uploading unchanged binaries
+    [
+        """
+        CREATE TABLE IF NOT EXISTS scan_cache (
+            file_hash TEXT PRIMARY KEY,
+            mobsf_version TEXT,
+            scorecard TEXT NOT NULL,
+            icon_path TEXT,
+            pdf_path TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ],
+    # 2: indexes for the dashboard's batch, inventory and app-history queries
+    [
+        "CREATE INDEX IF NOT EXISTS idx_scans_batch_id ON scans (batch_id)",
+        "CREATE INDEX IF NOT EXISTS idx_scans_bundle_batch ON scans (bundle_id, batch_id)",
+        "ANALYZE",
+    ],
+    # 3: per-app checkpoints so an interrupted batch can be resumed with scan.py --resume
+    [
+        """
+        CREATE TABLE IF NOT EXISTS scan_progress (
+            batch_id INTEGER NOT NULL,
+            file TEXT NOT NULL,
+            stage TEXT NOT NULL,
+            scan_hash TEXT,
+            state TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (batch_id, file),
+            FOREIGN KEY (batch_id) REFERENCES batches(id)
+        )
+        """,
+    ],
+    # 4: per-batch totals and latest scan per bundle_id, so the dashboard does not aggregate all of scans
+    [
+        """
+        CREATE TABLE IF NOT EXISTS batch_summary (
+            batch_id INTEGER PRIMARY KEY,
+            scan_count INTEGER NOT NULL,
+            high_findings INTEGER NOT NULL,
+            warning_findings INTEGER NOT NULL,
+            info_findings INTEGER NOT NULL,
+            secure_findings INTEGER NOT NULL,
+            score_total INTEGER NOT NULL,
+            android_high_findings INTEGER NOT NULL,
+            ios_high_findings INTEGER NOT NULL,
+            FOREIGN KEY (batch_id) REFERENCES batches(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS latest_scans (
+            bundle_id TEXT PRIMARY KEY,
+            scan_id INTEGER NOT NULL,
+            batch_id INTEGER NOT NULL,
+            batch_date TEXT,
+            app_name TEXT,
+            platform TEXT,
+            security_score INTEGER,
+            high_findings INTEGER,
+            warning_findings INTEGER,
+            info_findings INTEGER,
+            icon_path TEXT,
+            FOREIGN KEY (scan_id) REFERENCES scans(id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_latest_scans_app_name ON latest_scans (app_name)",
+    ],
+    # 5: every scorecard finding, with titles and descriptions interned so a scan stores only integer pairs
+    [
+        """
+        CREATE TABLE IF NOT EXISTS finding_text (
+            id INTEGER PRIMARY KEY,
+            text TEXT NOT NULL UNIQUE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS findings (
+            id INTEGER PRIMARY KEY,
+            severity TEXT NOT NULL,
+            section TEXT NOT NULL,
+            title_id INTEGER NOT NULL,
+            description_id INTEGER NOT NULL,
+            UNIQUE (title_id, description_id, severity, section),
+            FOREIGN KEY (title_id) REFERENCES finding_text(id),
+            FOREIGN KEY (description_id) REFERENCES finding_text(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS scan_findings (
+            scan_id INTEGER NOT NULL,
+            finding_id INTEGER NOT NULL,
+            PRIMARY KEY (scan_id, finding_id),
+            FOREIGN KEY (scan_id) REFERENCES scans(id),
+            FOREIGN KEY (finding_id) REFERENCES findings(id)
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_scan_findings_finding ON scan_findings (finding_id)",
+    ],
+    # 6: per-app stage durations of every scan attempt, which scan.py uses to order a batch longest-first
+    [
+        """
+        CREATE TABLE IF NOT EXISTS scan_timings (
+            id INTEGER PRIMARY KEY,
+            batch_id INTEGER,
+            file TEXT NOT NULL,
+            file_size INTEGER NOT NULL,
+            file_mtime INTEGER NOT NULL,
+            succeeded INTEGER NOT NULL,
+            cached INTEGER NOT NULL,
+            resumed INTEGER NOT NULL,
+            total_seconds REAL NOT NULL,
+            stages TEXT NOT NULL,
+            recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_scan_timings_file ON scan_timings (file, id)",
+    ],
+    # 7: the real package / bundle identifier read from the binary (bundle_id holds MobSF's file_name)
+    [
+        "ALTER TABLE scans ADD COLUMN package_name TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_scans_package_version ON scans (package_name, version)",
+    ],
+    # 8: wall-clock, outcome counts and per-stage timing summary of every scan.py run, written as it exits
+    [
+        """
+        CREATE TABLE IF NOT EXISTS batch_runs (
+            id INTEGER PRIMARY KEY,
+            batch_id INTEGER,
+            mode TEXT NOT NULL,
+            workers INTEGER NOT NULL,
+            wall_seconds REAL NOT NULL,
+            predicted_seconds REAL,
+            apps_scanned INTEGER NOT NULL,
+            apps_cached INTEGER NOT NULL,
+            apps_failed INTEGER NOT NULL,
+            retries INTEGER NOT NULL,
+            bytes_uploaded INTEGER NOT NULL,
+            bytes_downloaded INTEGER NOT NULL,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (batch_id) REFERENCES batches(id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_batch_runs_batch ON batch_runs (batch_id)",
+        """
+        CREATE TABLE IF NOT EXISTS batch_stage_timings (
+            run_id INTEGER NOT NULL,
+            batch_id INTEGER,
+            stage TEXT NOT NULL,
+            runs INTEGER NOT NULL,
+            failures INTEGER NOT NULL,
+            retries INTEGER NOT NULL,
+            total_seconds REAL NOT NULL,
+            p50_seconds REAL NOT NULL,
+            p95_seconds REAL NOT NULL,
+            max_seconds REAL NOT NULL,
+            PRIMARY KEY (run_id, stage),
+            FOREIGN KEY (run_id) REFERENCES batch_runs(id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_batch_stage_timings_batch ON batch_stage_timings (batch_id)",
+    ],
+    # 9: scans that have a security score, so the dashboard average skips unscored ones like AVG() did;
+    # also where the rollups are first filled, since ROLLUP_REBUILD needs this column
+    [
+        "ALTER TABLE batch_summary ADD COLUMN scored_count INTEGER NOT NULL DEFAULT 0",
+    ] + ROLLUP_REBUILD,
+]
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def enable_wal(conn):
+    # WAL lets the dashboard keep reading while scan.py writes; the mode is persisted in the file
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+def migrate(conn):
+    version = schema_version(conn)
+    for number in range(version + 1, len(MIGRATIONS) + 1):
+        conn.execute("BEGIN")
+        try:
+            for statement in MIGRATIONS[number - 1]:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+    return schema_version(conn)
+
+def update_rollups(conn, scan_id):
+    # Call in the same transaction as the INSERT INTO scans it accounts for
+    for statement in ROLLUP_UPDATE:
+        conn.execute(statement, (scan_id,))
+
+def refresh_latest_scan(conn, bundle_id):
+    for statement in ROLLUP_REFRESH_BUNDLE:
+        conn.execute(statement, (bundle_id,))
+
+def rebuild_rollups(conn):
+    conn.execute("BEGIN")
+    try:
+        for statement in ROLLUP_REBUILD:
+            conn.execute(statement)
+        conn.execute("COMMIT")
+    except sqlite3.Error:
+        conn.execute("ROLLBACK")
+        raise
+
+def migrate_db(db_path, rebuild=False):
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        enable_wal(conn)
+        before = schema_version(conn)
+        after = migrate(conn)
+        if rebuild:
+            rebuild_rollups(conn)
+    finally:
+        conn.close()
+    return before, after
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations to the MobSF scans database")
+    parser.add_argument("db_path", nargs="?", default=DB_PATH, help=f"Path to the SQLite database (default: {DB_PATH})")
+
+    parser.add_argument("--rebuild-rollups", action="store_true",
+                        help="Recompute batch_summary and latest_scans from the scans table")
+
+    args = parser.parse_args()
+
+    before, after = migrate_db(args.db_path, args.rebuild_rollups)
+    if before == after:
+        print(f"Database already at schema version {after}.")
+    else:
+        print(f"Migrated database from schema version {before} to {after}.")
+    if args.rebuild_rollups:
+        print("Rebuilt dashboard rollup tables.")
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# fake_mobsf.py - local stand-in for the MobSF endpoints scan.py talks to
+
+import os
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+
+SCORECARD_TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mobsf_scorecard.json")
+CHUNK_SIZE = 64 * 1024
+
+# Status lines MobSF writes to scan_logs while it analyses, in order
+SCAN_STATUSES = [
+    "Extracting APK",
+    "Getting Hardcoded Certificates/Keystores",
+    "Decompiling to Java",
+    "Code Analysis Started",
+    "Saving to Database",
+]
+
+# 1x1 transparent PNG
+ICON_BYTES = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000100e221bc330000000049454e44ae426082"
+)
+
+DEFAULT_CONFIG = {
+    "api_key": "fake-api-key",
+    "username": "mobsf",
+    "password": "mobsf",
+    "latency": 0.05,  # seconds added to every API call
+    "scan_seconds": 1.0,  # fixed analysis time per app
+    "scan_seconds_per_mb": 0.2,  # extra analysis time per MB uploaded
+    "failure_rate": 0.0,  # probability of an HTTP 500 on any API call
+    "max_scans": 0,  # analyses that can run at once before uploads and scans get HTTP 503 (0 = unlimited)
+    "session_ttl": 0,  # seconds a login cookie stays valid before web pages redirect to /login/ (0 = forever)
+    "icon_missing_rate": 0.1,  # probability an icon request 404s
+    "pdf_size": 512 * 1024,
+}
+
+class FakeMobSF:
+    def __init__(self, config):
+        self.config = dict(DEFAULT_CONFIG, **config)
+        self.lock = threading.Lock()
+        self.uploads = {}  # hash -> {"file_name", "size"}
+        self.scans = {}  # hash -> {"started", "duration"}
+        self.sessions = {}  # sessionid -> login time
+        with open(SCORECARD_TEMPLATE) as f:
+            self.template = json.load(f)
+
+    def scan_duration(self, scan_hash):
+        size_mb = self.uploads[scan_hash]["size"] / 1024 / 1024
+        return self.config["scan_seconds"] + size_mb * self.config["scan_seconds_per_mb"]
+
+    def running_scans(self):
+        now = time.monotonic()
+        with self.lock:
+            return sum(1 for scan in self.scans.values() if now < scan["started"] + scan["duration"])
+
+    def saturated(self):
+        return 0 < self.config["max_scans"] <= self.running_scans()
+
+    def scan_status(self, scan_hash):
+        with self.lock:
+            scan = self.scans.get(scan_hash)
+        if scan is None:
+            return []
+        progress = (time.monotonic() - scan["started"]) / max(scan["duration"], 0.001)
+        reached = min(int(progress * (len(SCAN_STATUSES) - 1)) + 1, len(SCAN_STATUSES))
+        return [{"timestamp": "", "status": status, "exception": None} for status in SCAN_STATUSES[:reached]]
+
+    def scorecard(self, scan_hash):
+        # Same shape as a real scorecard, with per-app name, counts and score
+        upload = self.uploads[scan_hash]
+        rng = random.Random(scan_hash)
+        card = dict(self.template)
+        for severity in ("high", "warning", "info", "secure", "hotspot"):
+            findings = self.template.get(severity, [])
+            card[severity] = rng.sample(findings, rng.randint(0, len(findings)))
+        name = os.path.splitext(upload["file_name"])[0]
+        card.update({
+            "app_name": name.replace("_", " "),
+            "file_name": upload["file_name"],
+            "hash": scan_hash,
+            "version_name": f"{rng.randint(1, 9)}.{rng.randint(0, 20)}.{rng.randint(0, 9)}",
+            "security_score": rng.randint(30, 70),
+        })
+        return card
+
+class FakeMobSFHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def mobsf(self):
+        return self.server.mobsf
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, data, headers=None):
+        self.send_body(status, json.dumps(data).encode("utf-8"), "application/json", headers)
+
+    def send_body(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_form(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode("utf-8")).items()}
+
+    def logged_in(self):
+        cookie = self.headers.get("Cookie", "")
+        ttl = self.mobsf.config["session_ttl"]
+        with self.mobsf.lock:
+            return any(f"sessionid={session}" in cookie and (not ttl or time.monotonic() - created < ttl)
+                       for session, created in self.mobsf.sessions.items())
+
+    def authorized(self):
+        return self.headers.get("Authorization") == self.mobsf.config["api_key"] or self.logged_in()
+
+    def redirect_to_login(self):
+        # What Django's login_required does for the web pages; the REST API only looks at the API key
+        return self.send_body(302, b"", "text/html", {"Location": f"/login/?next={self.path}"})
+
+    def do_GET(self):
+        if self.path.startswith("/login/"):
+            page = b'<form method="post"><input type="hidden" name="csrfmiddlewaretoken" value="fake-csrf-token"></form>'
+            return self.send_body(200, page, "text/html", {"Set-Cookie": "csrftoken=fake-csrf-token; Path=/"})
+
+        if self.path.startswith("/download/") and self.path.endswith("-icon.png"):
+            if not self.logged_in():
+                return self.redirect_to_login()
+            if random.random() < self.mobsf.config["icon_missing_rate"]:
+                return self.send_body(404, b"Not Found", "text/plain")
+            return self.send_body(200, ICON_BYTES, "image/png")
+
+        if self.path == "/":
+            if not self.logged_in():
+                return self.redirect_to_login()
+            return self.send_body(200, b"MobSF", "text/html")
+        self.send_body(404, b"Not Found", "text/plain")
+
+    def do_POST(self):
+        if self.path.startswith("/login/"):
+            return self.handle_login()
+        if not self.path.startswith("/api/v1/"):
+            return self.send_body(404, b"Not Found", "text/plain")
+        if not self.authorized():
+            return self.send_json(401, {"error": "You are unauthorized to make this request."})
+
+        config = self.mobsf.config
+        time.sleep(config["latency"])
+        if random.random() < config["failure_rate"]:
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            return self.send_json(500, {"error": "Injected failure"})
+        if self.path in ("/api/v1/upload", "/api/v1/scan") and self.mobsf.saturated():
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            return self.send_json(503, {"error": "Too many analyses running"})
+
+        handlers = {
+            "/api/v1/upload": self.handle_upload,
+            "/api/v1/scan": self.handle_scan,
+            "/api/v1/scan_logs": self.handle_scan_logs,
+            "/api/v1/scorecard": self.handle_scorecard,
+            "/api/v1/download_pdf": self.handle_pdf,
+        }
+        handler = handlers.get(self.path)
+        if handler is None:
+            return self.send_json(404, {"error": "API does not exist"})
+        handler()
+
+    def handle_login(self):
+        form = self.read_form()
+        config = self.mobsf.config
+        if (form.get("csrfmiddlewaretoken") != "fake-csrf-token"
+                or form.get("username") != config["username"] or form.get("password") != config["password"]):
+            return self.send_body(302, b"", "text/html", {"Location": "/login/"})
+        session = hashlib.md5(os.urandom(16)).hexdigest()
+        with self.mobsf.lock:
+            self.mobsf.sessions[session] = time.monotonic()
+        self.send_body(302, b"", "text/html", {"Location": "/", "Set-Cookie": f"sessionid={session}; Path=/"})
+
+    def handle_upload(self):
+        # Stream the multipart body, hashing only the file part the way MobSF does
+        boundary = self.headers.get("Content-Type", "").split("boundary=")[-1].encode("utf-8")
+        trailer = len(b"\r\n--" + boundary + b"--\r\n")
+        remaining = int(self.headers.get("Content-Length", 0))
+        header = b""
+        tail = b""
+        digest = hashlib.md5()
+        size = 0
+        file_name = "upload.bin"
+        while remaining > 0:
+            chunk = self.rfile.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            if header is not None and b"\r\n\r\n" not in header + chunk:
+                header += chunk
+                continue
+            if header is not None:
+                header, _, chunk = (header + chunk).partition(b"\r\n\r\n")
+                file_name = header.split(b'filename="')[-1].split(b'"')[0].decode("utf-8", "replace")
+                header = None
+            data = tail + chunk
+            tail = data[-trailer:]
+            digest.update(data[:-trailer])
+            size += len(data) - len(tail)
+
+        scan_hash = digest.hexdigest()
+        with self.mobsf.lock:
+            self.mobsf.uploads[scan_hash] = {"file_name": file_name, "size": size}
+        scan_type = os.path.splitext(file_name)[1].lstrip(".")
+        self.send_json(200, {"file_name": file_name, "hash": scan_hash, "scan_type": scan_type})
+
+    def handle_scan(self):
+        scan_hash = self.read_form().get("hash")
+        if scan_hash not in self.mobsf.uploads:
+            return self.send_json(500, {"error": "Invalid hash"})
+        duration = self.mobsf.scan_duration(scan_hash)
+        with self.mobsf.lock:
+            self.mobsf.scans[scan_hash] = {"started": time.monotonic(), "duration": duration}
+        # Like MobSF, the request only returns once the analysis is done
+        time.sleep(duration)
+        self.send_json(200, {"app_name": self.mobsf.uploads[scan_hash]["file_name"], "md5": scan_hash})
+
+    def handle_scan_logs(self):
+        scan_hash = self.read_form().get("hash")
+        logs = self.mobsf.scan_status(scan_hash)
+        if not logs:
+            return self.send_json(404, {"error": "Scan not found"})
+        self.send_json(200, {"logs": logs})
+
+    def handle_scorecard(self):
+        scan_hash = self.read_form().get("hash")
+        if scan_hash not in self.mobsf.scans:
+            return self.send_json(404, {"error": "Report not Found"})
+        self.send_json(200, self.mobsf.scorecard(scan_hash))
+
+    def handle_pdf(self):
+        scan_hash = self.read_form().get("hash")
+        if scan_hash not in self.mobsf.scans:
+            return self.send_json(404, {"error": "Report not Found"})
+        size = self.mobsf.config["pdf_size"]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        self.wfile.write(b"%PDF-1.4\n"[:size])
+        filler = b"0" * CHUNK_SIZE
+        written = min(size, 9)
+        while written < size:
+            self.wfile.write(filler[:size - written])
+            written += min(CHUNK_SIZE, size - written)
+
+def start_server(port=0, **config):
+    """Start a fake MobSF in a background thread; returns (server, base_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeMobSFHandler)
+    server.daemon_threads = True
+    server.mobsf = FakeMobSF(config)
+    threading.Thread(target=server.serve_forever, name="fake-mobsf", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local fake MobSF server for testing scan.py")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on (default: 8000)")
+    parser.add_argument("--api-key", default=DEFAULT_CONFIG["api_key"])
+    parser.add_argument("--username", default=DEFAULT_CONFIG["username"])
+    parser.add_argument("--password", default=DEFAULT_CONFIG["password"])
+    parser.add_argument("--latency", type=float, default=DEFAULT_CONFIG["latency"],
+                        help="Seconds added to every API call")
+    parser.add_argument("--scan-seconds", type=float, default=DEFAULT_CONFIG["scan_seconds"],
+                        help="Fixed analysis time per app")
+    parser.add_argument("--scan-seconds-per-mb", type=float, default=DEFAULT_CONFIG["scan_seconds_per_mb"],
+                        help="Extra analysis time per uploaded MB")
+    parser.add_argument("--failure-rate", type=float, default=DEFAULT_CONFIG["failure_rate"],
+                        help="Probability of an HTTP 500 on any API call")
+    parser.add_argument("--max-scans", type=int, default=DEFAULT_CONFIG["max_scans"],
+                        help="Analyses that can run at once before uploads and scans get HTTP 503 (0 = unlimited)")
+    parser.add_argument("--icon-missing-rate", type=float, default=DEFAULT_CONFIG["icon_missing_rate"],
+                        help="Probability that an icon download 404s")
+    parser.add_argument("--session-ttl", type=float, default=DEFAULT_CONFIG["session_ttl"],
+                        help="Seconds a login cookie stays valid (0 = forever)")
+    parser.add_argument("--pdf-size", type=int, default=DEFAULT_CONFIG["pdf_size"], help="PDF report size in bytes")
+
+    args = parser.parse_args()
+    config = {key: value for key, value in vars(args).items() if key != "port"}
+
+    server, url = start_server(args.port, **config)
+    print(f"Fake MobSF listening on {url} (API key: {args.api_key}, login: {args.username}/{args.password})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+import sqlite3
+import argparse
+
+# Configuration
+DB_PATH = "mobsf_scans.db"
+SEVERITIES = ["high", "warning", "info", "secure", "hotspot"]
+
+def intern_text(conn, text, cache):
+    # finding_text holds each distinct title/description once; cache saves the lookup within one scorecard
+    if text not in cache:
+        conn.execute("INSERT OR IGNORE INTO finding_text (text) VALUES (?)", (text,))
+        cache[text] = conn.execute("SELECT id FROM finding_text WHERE text = ?", (text,)).fetchone()[0]
+    return cache[text]
+
+def finding_id(conn, severity, section, title_id, description_id):
+    key = (title_id, description_id, severity, section)
+    conn.execute(
+        "INSERT OR IGNORE INTO findings (title_id, description_id, severity, section) VALUES (?, ?, ?, ?)", key
+    )
+    return conn.execute(
+        "SELECT id FROM findings WHERE title_id = ? AND description_id = ? AND severity = ? AND section = ?", key
+    ).fetchone()[0]
+
+def store_findings(conn, scan_id, scorecard):
+    # Call in the same transaction as the INSERT INTO scans the findings belong to
+    texts = {}
+    ids = set()
+    for severity in SEVERITIES:
+        for finding in scorecard.get(severity) or []:
+            title_id = intern_text(conn, finding.get("title") or "", texts)
+            description_id = intern_text(conn, finding.get("description") or "", texts)
+            ids.add(finding_id(conn, severity, finding.get("section") or "", title_id, description_id))
+    conn.executemany("INSERT OR IGNORE INTO scan_findings (scan_id, finding_id) VALUES (?, ?)",
+                     [(scan_id, finding) for finding in ids])
+    return len(ids)
+
+def scan_finding_ids(conn, scan_id):
+    return {row[0] for row in conn.execute("SELECT finding_id FROM scan_findings WHERE scan_id = ?", (scan_id,))}
+
+def latest_scan_ids(conn, batch_id, bundle_id=None):
+    # bundle_id -> newest scan of that app in the batch
+    if bundle_id is None:
+        rows = conn.execute("SELECT bundle_id, MAX(id) FROM scans WHERE batch_id = ? GROUP BY bundle_id", (batch_id,))
+    else:
+        rows = conn.execute("SELECT bundle_id, MAX(id) FROM scans WHERE bundle_id = ? AND batch_id = ?",
+                            (bundle_id, batch_id))
+    return {bundle: scan_id for bundle, scan_id in rows if scan_id is not None}
+
+def diff_scans(conn, old_scan_id, new_scan_id):
+    old = scan_finding_ids(conn, old_scan_id) if old_scan_id else set()
+    new = scan_finding_ids(conn, new_scan_id) if new_scan_id else set()
+    return {"new": new - old, "resolved": old - new, "persisting": old & new}
+
+def diff_batches(conn, old_batch_id, new_batch_id, bundle_id=None):
+    old_scans = latest_scan_ids(conn, old_batch_id, bundle_id)
+    new_scans = latest_scan_ids(conn, new_batch_id, bundle_id)
+    return {
+        bundle: diff_scans(conn, old_scans.get(bundle), new_scans.get(bundle))
+        for bundle in sorted(set(old_scans) | set(new_scans), key=str)
+    }
+
+def previous_batches(conn, bundle_id):
+    # The two most recent batches the app was scanned in, oldest first
+    rows = conn.execute("SELECT DISTINCT batch_id FROM scans WHERE bundle_id = ? ORDER BY batch_id DESC LIMIT 2",
+                        (bundle_id,)).fetchall()
+    return [row[0] for row in reversed(rows)]
+
+def describe_findings(conn, ids):
+    if not ids:
+        return []
+    ids = list(ids)
+    rows = conn.execute(f"""
+        SELECT f.severity, t.text
+        FROM findings f
+        JOIN finding_text t ON t.id = f.title_id
+        WHERE f.id IN ({','.join('?' * len(ids))})
+    """, ids).fetchall()
+    return sorted(rows, key=lambda row: (SEVERITIES.index(row[0]) if row[0] in SEVERITIES else len(SEVERITIES), row[1]))
+
+def print_diff(conn, old_batch_id, new_batch_id, diffs, show_persisting=False):
+    print(f"Findings in batch {new_batch_id} compared with batch {old_batch_id}")
+    for bundle, diff in diffs.items():
+        print(f"\n{bundle}: {len(diff['new'])} new, {len(diff['resolved'])} resolved, "
+              f"{len(diff['persisting'])} persisting")
+        sections = [("+", "new"), ("-", "resolved")] + ([("=", "persisting")] if show_persisting else [])
+        for marker, key in sections:
+            for severity, title in describe_findings(conn, diff[key]):
+                print(f"  {marker} [{severity}] {title}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare stored MobSF findings between two batches")
+    parser.add_argument("--db", default=DB_PATH, help=f"Path to the SQLite database (default: {DB_PATH})")
+    parser.add_argument("--bundle", help="Only this app; without --from/--to its last two batches are compared")
+    parser.add_argument("--from", dest="old_batch", type=int, help="Older batch id")
+    parser.add_argument("--to", dest="new_batch", type=int, help="Newer batch id")
+    parser.add_argument("--persisting", action="store_true", help="Also list findings present in both batches")
+
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        old_batch, new_batch = args.old_batch, args.new_batch
+        if old_batch is None or new_batch is None:
+            if not args.bundle:
+                parser.error("--from and --to are required unless --bundle is given")
+            batches = previous_batches(conn, args.bundle)
+            if len(batches) < 2:
+                print(f"{args.bundle} has been scanned in fewer than two batches.")
+                return
+            old_batch, new_batch = batches
+        print_diff(conn, old_batch, new_batch, diff_batches(conn, old_batch, new_batch, args.bundle), args.persisting)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
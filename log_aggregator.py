@@ -3,66 +3,156 @@
 
 import asyncio
 import json
-import sys
-import asyncio
+import threading
 import websockets
 import docker
 from datetime import datetime
 
-async def docker_logs_stream(container_name, websocket):
+SCAN_LOG_FILE = '/home/pron/mobsf/mobsf_scans.log'
+CONTAINER_NAME = 'mobsf'
+BATCH_MAX_LINES = 200  # lines coalesced into one websocket frame
+BATCH_MAX_DELAY = 0.25  # seconds a line may wait for its frame to fill
+CLIENT_QUEUE_SIZE = 5000  # lines buffered per client before new ones are dropped
+COMPRESSION = "deflate"  # permessage-deflate; None to send frames uncompressed
+
+def log_entry(source, line):
+    return {
+        "source": source,
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "message": line.decode(errors='replace').strip()
+    }
+
+class ClientQueue:
+    """Bounded per-client line buffer; lines arriving while it is full are counted and dropped."""
+
+    def __init__(self, maxsize=None):
+        self.queue = asyncio.Queue(maxsize=maxsize or CLIENT_QUEUE_SIZE)
+        self.dropped = 0
+
+    def put(self, entry):
+        try:
+            self.queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def next_batch(self):
+        # Wait for one line, then take whatever else arrives within BATCH_MAX_DELAY
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + BATCH_MAX_DELAY
+        while len(batch) < BATCH_MAX_LINES:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        if self.dropped:
+            batch.append({
+                "source": "system",
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "message": f"Dropped {self.dropped} log lines, client is falling behind"
+            })
+            self.dropped = 0
+        return batch
+
+async def docker_logs_stream(container_name, client):
+    # docker-py's log generator blocks, so it is read on a thread that hands lines back to the loop
+    loop = asyncio.get_running_loop()
+    stream = None
+    stream_lock = threading.Lock()
+    stop = threading.Event()
+    done = asyncio.Event()
+
+    def read_logs():
+        nonlocal stream
+        try:
+            docker_client = docker.from_env()
+            container = docker_client.containers.get(container_name)
+            opened = container.logs(stream=True, follow=True, tail=100)
+            with stream_lock:
+                stream = opened
+                # The websocket may have gone away while the stream was being opened
+                if stop.is_set():
+                    opened.close()
+                    return
+            for line in opened:
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(client.put, log_entry("mobsf-docker", line))
+        except docker.errors.NotFound:
+            print(f"Container {container_name} not found")
+        except Exception as e:
+            if not stop.is_set():
+                print(f"Error streaming docker logs: {e}")
+        finally:
+            try:
+                loop.call_soon_threadsafe(done.set)
+            except RuntimeError:
+                pass  # the event loop has already shut down
+
+    threading.Thread(target=read_logs, name="docker-logs", daemon=True).start()
     try:
-        client = docker.from_env()
-        container = client.containers.get(container_name)
-        
-        for line in container.logs(stream=True, follow=True, tail=100):
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            log_entry = {
-                "source": "mobsf-docker",
-                "timestamp": timestamp,
-                "message": line.decode().strip()
-            }
-            await websocket.send(json.dumps(log_entry))
-    except docker.errors.NotFound:
-        print(f"Container {container_name} not found")
-    except Exception as e:
-        print(f"Error streaming docker logs: {e}")
+        await done.wait()
+    finally:
+        # Unblocks the reader thread when the websocket goes away; if the stream is not open yet,
+        # the reader sees stop and closes it itself
+        with stream_lock:
+            stop.set()
+            if stream is not None:
+                stream.close()
 
-async def scan_logs_stream(log_file, websocket):
+async def scan_logs_stream(log_file, client):
     try:
         process = await asyncio.create_subprocess_exec(
-            'tail', '-f', log_file,
+            'tail', '-F', log_file,
             stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
+            stderr=asyncio.subprocess.DEVNULL
         )
 
-        while True:
-            line = await process.stdout.readline()
-            if not line:
-                break
-                
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            log_entry = {
-                "source": "scan-script",
-                "timestamp": timestamp,
-                "message": line.decode().strip()
-            }
-            await websocket.send(json.dumps(log_entry))
+        try:
+            while True:
+                line = await process.stdout.readline()
+                if not line:
+                    break
+                client.put(log_entry("scan-script", line))
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+    except asyncio.CancelledError:
+        raise
     except Exception as e:
         print(f"Error streaming scan logs: {e}")
 
-async def start_server(websocket, path):
+async def send_batches(websocket, client):
+    # One JSON array per frame instead of one frame per line
+    while True:
+        batch = await client.next_batch()
+        await websocket.send(json.dumps(batch))
+
+async def start_server(websocket, path=None):
+    client = ClientQueue()
     tasks = [
-        asyncio.create_task(docker_logs_stream('mobsf', websocket)),
-        asyncio.create_task(scan_logs_stream('/home/pron/mobsf/mobsf_scans.log', websocket))
+        asyncio.create_task(docker_logs_stream(CONTAINER_NAME, client)),
+        asyncio.create_task(scan_logs_stream(SCAN_LOG_FILE, client))
     ]
-    
+
+    sender = asyncio.create_task(send_batches(websocket, client))
+    closed = asyncio.create_task(websocket.wait_closed())
+    tasks += [sender, closed]
+
     try:
-        await asyncio.gather(*tasks)
-    except websockets.exceptions.ConnectionClosed:
+        # The sender may be idle waiting for lines, so also watch for the client going away
+        await asyncio.wait([sender, closed], return_when=asyncio.FIRST_COMPLETED)
+    finally:
         for task in tasks:
             task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def main():
+    async with websockets.serve(start_server, "localhost", 8765, compression=COMPRESSION):
+        await asyncio.Future()
 
 if __name__ == "__main__":
-    start_server = websockets.serve(start_server, "localhost", 8765)
-    asyncio.get_event_loop().run_until_complete(start_server)
-    asyncio.get_event_loop().run_forever()
+    asyncio.run(main())
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+import os
+import re
+import glob
+import json
+import time
+import sqlite3
+import argparse
+
+# Configuration
+LOG_FILE = "mobsf_scans.log"
+LOG_DB_PATH = "mobsf_logs.db"
+INGEST_CHUNK_LINES = 10000  # lines parsed and committed per transaction
+LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
+
+# Lines written with scan.py --log-format text
+TEXT_LINE = re.compile(r"\[(?P<timestamp>[^\]]+)\] \[(?P<level>[A-Z]+)\] (?P<message>.*)")
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS log_records (
+        id INTEGER PRIMARY KEY,
+        timestamp TEXT,
+        level TEXT,
+        batch_id INTEGER,
+        file TEXT,
+        scan_hash TEXT,
+        stage TEXT,
+        message TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_log_batch_level ON log_records (batch_id, level)",
+    "CREATE INDEX IF NOT EXISTS idx_log_file_level_batch ON log_records (file, level, batch_id)",
+    "CREATE INDEX IF NOT EXISTS idx_log_scan_hash ON log_records (scan_hash)",
+    "CREATE INDEX IF NOT EXISTS idx_log_timestamp ON log_records (timestamp)",
+    # Full-text index over messages; filled per ingest chunk rather than by a per-row trigger, which is ~3x slower
+    "CREATE VIRTUAL TABLE IF NOT EXISTS log_messages USING fts5(message, content='log_records', content_rowid='id')",
+    # How far each log file has been read; keyed by inode so rotated files are not read twice
+    """
+    CREATE TABLE IF NOT EXISTS ingest_state (
+        inode INTEGER PRIMARY KEY,
+        path TEXT NOT NULL,
+        offset INTEGER NOT NULL
+    )
+    """,
+]
+
+INSERT_RECORD = """
+INSERT INTO log_records (timestamp, level, batch_id, file, scan_hash, stage, message)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    for statement in SCHEMA:
+        conn.execute(statement)
+    return conn
+
+def parse_line(line):
+    try:
+        record = json.loads(line)
+    except ValueError:
+        match = TEXT_LINE.match(line)
+        if not match:
+            return None
+        return (match["timestamp"], match["level"], None, None, None, None, match["message"])
+    if not isinstance(record, dict):
+        return None
+    return (record.get("timestamp"), record.get("level"), record.get("batch_id"), record.get("file"),
+            record.get("scan_hash"), record.get("stage"), record.get("message"))
+
+def log_files(log_file):
+    # Oldest rotation first (mobsf_scans.log.5 ... .1, then the live file) so ids follow time
+    rotated = sorted(glob.glob(f"{glob.escape(log_file)}.[0-9]*"),
+                     key=lambda path: int(path.rsplit(".", 1)[1]) if path.rsplit(".", 1)[1].isdigit() else 0,
+                     reverse=True)
+    return [path for path in rotated + [log_file] if os.path.isfile(path)]
+
+def ingest_file(conn, path):
+    stat = os.stat(path)
+    row = conn.execute("SELECT offset FROM ingest_state WHERE inode = ?", (stat.st_ino,)).fetchone()
+    offset = row[0] if row else 0
+    if offset > stat.st_size:
+        # Truncated, or the inode was reused by a new file
+        offset = 0
+
+    ingested = 0
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while True:
+            lines = f.readlines(INGEST_CHUNK_LINES * 256)
+            if not lines:
+                break
+            if not lines[-1].endswith(b"\n"):
+                # Leave a partially written last line for the next run
+                lines.pop()
+                if not lines:
+                    break
+            records = [record for record in (parse_line(line.decode("utf-8", "replace")) for line in lines) if record]
+            offset += sum(len(line) for line in lines)
+            conn.execute("BEGIN")
+            try:
+                last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM log_records").fetchone()[0]
+                conn.executemany(INSERT_RECORD, records)
+                conn.execute("INSERT INTO log_messages (rowid, message) SELECT id, message FROM log_records WHERE id > ?",
+                             (last_id,))
+                conn.execute("INSERT OR REPLACE INTO ingest_state (inode, path, offset) VALUES (?, ?, ?)",
+                             (stat.st_ino, path, offset))
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+            ingested += len(records)
+            f.seek(offset)
+    return ingested
+
+def ingest(conn, log_file):
+    paths = log_files(log_file)
+    total = sum(ingest_file(conn, path) for path in paths)
+    # Forget files that have rotated out of existence
+    live = [os.stat(path).st_ino for path in paths]
+    conn.execute(f"DELETE FROM ingest_state WHERE inode NOT IN ({','.join('?' * len(live))})", live)
+    return total
+
+def query(conn, batch_ids=None, last_batches=None, file=None, scan_hash=None, level=None,
+          since=None, until=None, search=None, limit=100):
+    conditions = []
+    values = []
+    if batch_ids:
+        conditions.append(f"r.batch_id IN ({','.join('?' * len(batch_ids))})")
+        values += batch_ids
+    if last_batches:
+        conditions.append("r.batch_id IN (SELECT DISTINCT batch_id FROM log_records "
+                          "WHERE batch_id IS NOT NULL ORDER BY batch_id DESC LIMIT ?)")
+        values.append(last_batches)
+    if file:
+        conditions.append("r.file = ?")
+        values.append(file)
+    if scan_hash:
+        conditions.append("r.scan_hash = ?")
+        values.append(scan_hash)
+    if level:
+        # --level is a minimum severity, like scan.py --log-level
+        levels = LEVELS[LEVELS.index(level):]
+        conditions.append(f"r.level IN ({','.join('?' * len(levels))})")
+        values += levels
+    if since:
+        conditions.append("r.timestamp >= ?")
+        values.append(since)
+    if until:
+        conditions.append("r.timestamp < ?")
+        values.append(until)
+    if search:
+        conditions.append("r.id IN (SELECT rowid FROM log_messages WHERE log_messages MATCH ?)")
+        values.append(search)
+
+    sql = "SELECT r.timestamp, r.level, r.batch_id, r.file, r.scan_hash, r.stage, r.message FROM log_records r"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY r.id DESC LIMIT ?"
+    values.append(limit)
+    columns = ["timestamp", "level", "batch_id", "file", "scan_hash", "stage", "message"]
+    # Newest matches are selected, then printed oldest first like the log itself
+    return [dict(zip(columns, row)) for row in reversed(conn.execute(sql, values).fetchall())]
+
+def format_record(record):
+    context = " ".join(f"{key}={record[key]}" for key in ("batch_id", "file", "stage") if record[key] is not None)
+    return f"[{record['timestamp']}] [{record['level']}] {f'({context}) ' if context else ''}{record['message']}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Index scan.py logs in SQLite and search them by batch, app and scan hash")
+    parser.add_argument("--db", default=LOG_DB_PATH, help=f"Path to the log index database (default: {LOG_DB_PATH})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = subparsers.add_parser("ingest", help="Read new lines from the log file and its rotations")
+    ingest_parser.add_argument("--log-file", default=LOG_FILE, help=f"Log file written by scan.py (default: {LOG_FILE})")
+    ingest_parser.add_argument("--follow", type=float, metavar="SECONDS",
+                               help="Keep running and ingest again every SECONDS")
+
+    query_parser = subparsers.add_parser("query", help="Search indexed log records")
+    query_parser.add_argument("--batch", type=int, action="append", dest="batch_ids", metavar="BATCH_ID",
+                              help="Only this batch (repeatable)")
+    query_parser.add_argument("--last-batches", type=int, metavar="N", help="Only the N most recent batches")
+    query_parser.add_argument("--file", "--bundle", dest="file", help="Only this app file / bundle id")
+    query_parser.add_argument("--scan-hash", help="Only this MobSF scan hash")
+    query_parser.add_argument("--level", choices=LEVELS, help="Minimum level to show")
+    query_parser.add_argument("--since", help="Only records at or after this ISO timestamp")
+    query_parser.add_argument("--until", help="Only records before this ISO timestamp")
+    query_parser.add_argument("--search", help="Full-text search on the message (FTS5 syntax)")
+    query_parser.add_argument("--limit", type=int, default=100, help="Maximum records to show (default: 100)")
+    query_parser.add_argument("--json", action="store_true", help="Print records as JSON lines")
+
+    args = parser.parse_args()
+    conn = connect(args.db)
+
+    try:
+        if args.command == "ingest":
+            while True:
+                started = time.perf_counter()
+                count = ingest(conn, args.log_file)
+                print(f"Ingested {count} log records in {time.perf_counter() - started:.2f}s")
+                if not args.follow:
+                    break
+                time.sleep(args.follow)
+        else:
+            started = time.perf_counter()
+            records = query(conn, args.batch_ids, args.last_batches, args.file, args.scan_hash, args.level,
+                            args.since, args.until, args.search, args.limit)
+            for record in records:
+                print(json.dumps(record, ensure_ascii=False) if args.json else format_record(record))
+            if not args.json:
+                print(f"{len(records)} records in {(time.perf_counter() - started) * 1000:.1f} ms")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+import bisect
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# In-process counters, gauges and histograms, served in the Prometheus text format
+
+# Configuration
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+RESERVOIR_SIZE = 1024  # raw observations kept per histogram series for percentiles; memory stays flat in --watch
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(pairs):
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}" if pairs else ""
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Registry:
+    """Thread-safe store of labelled metrics.
+
+    Histograms also keep a uniform sample of their observations so a run can summarise percentiles at exit.
+    Collectors are called before each render to refresh gauges that mirror other state.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}  # name -> {"type", "help", "buckets", "samples": {label key: value or histogram}}
+        self.collectors = []
+
+    def describe(self, name, metric_type, help_text, buckets=DEFAULT_BUCKETS):
+        with self.lock:
+            self.metrics.setdefault(name, {"type": metric_type, "help": help_text, "buckets": buckets, "samples": {}})
+
+    def collect(self, collector):
+        self.collectors.append(collector)
+
+    def inc(self, name, amount=1, **labels):
+        with self.lock:
+            samples = self.metrics[name]["samples"]
+            key = label_key(labels)
+            samples[key] = samples.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.metrics[name]["samples"][label_key(labels)] = value
+
+    def observe(self, name, value, **labels):
+        with self.lock:
+            metric = self.metrics[name]
+            histogram = metric["samples"].setdefault(label_key(labels), {
+                "counts": [0] * len(metric["buckets"]), "count": 0, "sum": 0.0, "max": value, "values": [],
+            })
+            index = bisect.bisect_left(metric["buckets"], value)
+            if index < len(metric["buckets"]):
+                histogram["counts"][index] += 1
+            histogram["count"] += 1
+            histogram["sum"] += value
+            histogram["max"] = max(histogram["max"], value)
+            # Reservoir sampling: every observation so far has the same chance of being among the kept ones
+            if len(histogram["values"]) < RESERVOIR_SIZE:
+                histogram["values"].append(value)
+            else:
+                slot = random.randrange(histogram["count"])
+                if slot < RESERVOIR_SIZE:
+                    histogram["values"][slot] = value
+
+    def samples(self, name):
+        """[(labels, value)] for a counter or gauge; for a histogram the value is
+        {"count", "sum", "max", "values"}, values being the sampled observations."""
+        with self.lock:
+            metric = self.metrics[name]
+            if metric["type"] != "histogram":
+                return [(dict(key), value) for key, value in metric["samples"].items()]
+            return [(dict(key), {"count": value["count"], "sum": value["sum"], "max": value["max"],
+                                 "values": list(value["values"])})
+                    for key, value in metric["samples"].items()]
+
+    def render(self):
+        for collector in self.collectors:
+            collector()
+        lines = []
+        with self.lock:
+            for name, metric in self.metrics.items():
+                lines.append(f"# HELP {name} {metric['help']}")
+                lines.append(f"# TYPE {name} {metric['type']}")
+                for key, value in metric["samples"].items():
+                    if metric["type"] != "histogram":
+                        lines.append(f"{name}{format_labels(key)} {format_value(value)}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(metric["buckets"], value["counts"]):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{format_labels(key + (('le', bound),))} {cumulative}")
+                    lines.append(f"{name}_bucket{format_labels(key + (('le', '+Inf'),))} {value['count']}")
+                    lines.append(f"{name}_sum{format_labels(key)} {format_value(value['sum'])}")
+                    lines.append(f"{name}_count{format_labels(key)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def start_server(registry, port, host="127.0.0.1"):
+    """Serve registry on http://host:port/metrics from a background thread; returns the server."""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    server.registry = registry
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
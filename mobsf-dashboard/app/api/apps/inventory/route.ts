@@ -5,19 +5,8 @@ export async function GET(request: NextRequest) {
   try {
     const db = await openDb();
     
-    // Get unique apps with their latest scan info and icon paths
+    // Get unique apps with their latest scan info and icon paths (latest_scans is kept current by scan.py)
     const apps = await db.all(`
-      WITH RankedScans AS (
-        SELECT 
-          s.*,
-          b.batch_date,
-          ROW_NUMBER() OVER (
-            PARTITION BY s.bundle_id 
-            ORDER BY b.batch_date DESC, s.id DESC
-          ) as rn
-        FROM scans s
-        JOIN batches b ON s.batch_id = b.id
-      )
       SELECT 
         app_name,
         bundle_id,
@@ -29,8 +18,7 @@ export async function GET(request: NextRequest) {
         batch_id,
         batch_date,
         icon_path
-      FROM RankedScans
-      WHERE rn = 1
+      FROM latest_scans
       ORDER BY app_name ASC
     `);
 
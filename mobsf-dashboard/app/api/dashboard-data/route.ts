@@ -9,15 +9,14 @@ export async function GET() {
       SELECT 
         b.id as batchId,
         b.batch_date as batchDate,
-        SUM(s.high_findings) as highRisk,
-        SUM(s.warning_findings) as mediumRisk,
-        SUM(s.info_findings) as lowRisk,
-        AVG(s.security_score) as avgScore,
-        SUM(CASE WHEN s.platform = 'Android' THEN s.high_findings ELSE 0 END) as androidHighRisk,
-        SUM(CASE WHEN s.platform = 'iOS' THEN s.high_findings ELSE 0 END) as iosHighRisk
+        r.high_findings as highRisk,
+        r.warning_findings as mediumRisk,
+        r.info_findings as lowRisk,
+        CAST(r.score_total AS REAL) / NULLIF(r.scored_count, 0) as avgScore,
+        r.android_high_findings as androidHighRisk,
+        r.ios_high_findings as iosHighRisk
       FROM batches b
-      JOIN scans s ON b.id = s.batch_id
-      GROUP BY b.id
+      JOIN batch_summary r ON b.id = r.batch_id
       ORDER BY b.created_at
     `);
 
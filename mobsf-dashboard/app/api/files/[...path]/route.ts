@@ -19,11 +19,14 @@ export async function GET(
       contentType = 'image/png';
     }
 
-    return new NextResponse(fileBuffer, {
-      headers: {
-        'Content-Type': contentType,
-      },
-    });
+    const headers: Record<string, string> = { 'Content-Type': contentType };
+    // Files under objects/ are named by their sha256, so a URL's content never changes
+    if (decodedPath.includes('objects')) {
+      headers['Cache-Control'] = 'public, max-age=31536000, immutable';
+      headers['ETag'] = `"${path.basename(filePath, path.extname(filePath))}"`;
+    }
+
+    return new NextResponse(fileBuffer, { headers });
   } catch (error) {
     return NextResponse.json(
       { error: 'File not found' },
@@ -2,12 +2,25 @@ import sqlite3 from 'sqlite3';
 import { open } from 'sqlite';
 import path from 'path';
 
+// Schema version (PRAGMA user_version, see db_migrate.py MIGRATIONS) the API routes' queries rely on
+const SCHEMA_VERSION = 9;
+
 export async function openDb() {
   const dbPath = path.resolve(process.cwd(), '..','mobsf_scans.db');
   console.log('Attempting to open database at:', dbPath);
   
-  return open({
+  const db = await open({
     filename: dbPath,
     driver: sqlite3.Database
   });
-}
\ No newline at end of file
+
+  const { user_version: version } = await db.get('PRAGMA user_version');
+  if (version < SCHEMA_VERSION) {
+    await db.close();
+    throw new Error(
+      `Database ${dbPath} is at schema version ${version}, the dashboard needs ${SCHEMA_VERSION}: ` +
+      `run "python3 db_migrate.py" in the repository root`
+    );
+  }
+  return db;
+}
@@ -1,96 +1,136 @@
 #!/usr/bin/env python3
 # log_aggregator.py
 
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import json
-import asyncio
 import docker
 from datetime import datetime
 import subprocess
-from threading import Thread
+from threading import Thread, Lock
+from collections import deque
+import queue
 import signal
 import sys
+import time
 
-class LogStreamer:
-    def __init__(self, response):
-        self.response = response
-        self.running = True
-        self.docker_client = docker.from_env()
+SCAN_LOG_FILE = '/home/pron/mobsf/mobsf_scans.log'
+REPLAY_BUFFER_SIZE = 5000  # events kept in memory for clients reconnecting with Last-Event-ID
+CLIENT_QUEUE_SIZE = 1000  # events a slow client may fall behind before it is disconnected
+KEEPALIVE_SECONDS = 15
+PRODUCER_RETRY_SECONDS = 5  # wait before reattaching to a restarted container or a missing/rotated log
 
-    def send_event(self, data):
-        try:
-            message = f"data: {json.dumps(data)}\n\n"
-            self.response.wfile.write(message.encode('utf-8'))
-            self.response.wfile.flush()
-        except Exception as e:
-            print(f"Error sending event: {e}")
-            self.running = False
+class LogHub:
+    """Fans events from every log source out to all connected SSE clients.
+
+    Each event gets an increasing id and is kept in a ring buffer, so a client
+    reconnecting with Last-Event-ID is replayed what it missed from memory.
+    """
+
+    def __init__(self, buffer_size=REPLAY_BUFFER_SIZE):
+        self.lock = Lock()
+        self.buffer = deque(maxlen=buffer_size)
+        self.clients = set()
+        self.next_id = 1
+
+    def publish(self, data):
+        with self.lock:
+            event = (self.next_id, data)
+            self.next_id += 1
+            self.buffer.append(event)
+            for client in list(self.clients):
+                try:
+                    client.put_nowait(event)
+                except queue.Full:
+                    # Too far behind: drop it, the browser reconnects and replays from the buffer
+                    self.clients.discard(client)
+                    client.get_nowait()
+                    client.put_nowait(None)
+
+    def subscribe(self, last_event_id=None):
+        client = queue.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        with self.lock:
+            if last_event_id is not None:
+                replay = [event for event in self.buffer if event[0] > last_event_id]
+            else:
+                replay = []
+            self.clients.add(client)
+        return client, replay
 
-    def stream_docker_logs(self):
+    def unsubscribe(self, client):
+        with self.lock:
+            self.clients.discard(client)
+
+hub = LogHub()
+
+def publish_system(message):
+    print(message)
+    hub.publish({
+        "source": "system",
+        "timestamp": datetime.now().isoformat(),
+        "message": message
+    })
+
+def stream_docker_logs():
+    # One Docker client and one log follower, shared by every dashboard tab; reattaches whenever the stream ends
+    since = None
+    while True:
         try:
-            container = self.docker_client.containers.get('mobsf')
-            for line in container.logs(stream=True, follow=True, tail=100):
-                if not self.running:
-                    break
-                self.send_event({
+            docker_client = docker.from_env()
+            container = docker_client.containers.get('mobsf')
+            # After a reconnect only lines newer than the disconnect, so nothing is sent twice
+            options = {"tail": 100} if since is None else {"since": since}
+            for line in container.logs(stream=True, follow=True, **options):
+                hub.publish({
                     "source": "mobsf-docker",
                     "timestamp": datetime.now().isoformat(),
-                    "message": line.decode().strip()
+                    "message": line.decode(errors='replace').strip()
                 })
+            reason = "MobSF container log stream ended"
         except docker.errors.NotFound:
-            print("MobSF container not found")
+            reason = "MobSF container not found"
         except Exception as e:
-            print(f"Error streaming docker logs: {e}")
+            reason = f"Error streaming docker logs: {e}"
+        since = int(time.time())
+        publish_system(f"{reason}; reconnecting in {PRODUCER_RETRY_SECONDS}s")
+        time.sleep(PRODUCER_RETRY_SECONDS)
 
-    def stream_scan_logs(self):
+def stream_scan_logs():
+    lines = '100'
+    while True:
         try:
             process = subprocess.Popen(
-                ['tail', '-f', '/home/pron/mobsf/mobsf_scans.log'],
+                ['tail', '-n', lines, '-F', SCAN_LOG_FILE],
                 stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
                 universal_newlines=True
             )
-            
-            while self.running:
-                line = process.stdout.readline()
-                if not line:
-                    break
-                self.send_event({
+
+            for line in process.stdout:
+                hub.publish({
                     "source": "scan-script",
                     "timestamp": datetime.now().isoformat(),
                     "message": line.strip()
                 })
-                
-            process.terminate()
-            process.wait()
-            
+
+            reason = f"tail of {SCAN_LOG_FILE} exited with status {process.wait()}"
         except Exception as e:
-            print(f"Error streaming scan logs: {e}")
-
-    def start(self):
-        # Send initial connection message
-        self.send_event({
-            "source": "system",
-            "timestamp": datetime.now().isoformat(),
-            "message": "Connected to log stream"
-        })
-
-        # Start both streams in separate threads
-        docker_thread = Thread(target=self.stream_docker_logs)
-        scan_thread = Thread(target=self.stream_scan_logs)
-        
-        docker_thread.start()
-        scan_thread.start()
-        
-        while self.running:
-            try:
-                docker_thread.join(0.1)
-                scan_thread.join(0.1)
-            except KeyboardInterrupt:
-                self.running = False
-                break
+            reason = f"Error streaming scan logs: {e}"
+        lines = '0'
+        publish_system(f"{reason}; reconnecting in {PRODUCER_RETRY_SECONDS}s")
+        time.sleep(PRODUCER_RETRY_SECONDS)
+
+def start_producers():
+    for target in (stream_docker_logs, stream_scan_logs):
+        Thread(target=target, name=target.__name__, daemon=True).start()
 
 class LogHandler(BaseHTTPRequestHandler):
+    def send_event(self, data, event_id=None):
+        message = f"data: {json.dumps(data)}\n\n"
+        if event_id is not None:
+            message = f"id: {event_id}\n" + message
+        self.wfile.write(message.encode('utf-8'))
+        self.wfile.flush()
+
     def do_GET(self):
         if self.path == '/logs':
             self.send_response(200)
@@ -100,25 +140,52 @@ class LogHandler(BaseHTTPRequestHandler):
             self.send_header('Access-Control-Allow-Origin', '*')
             self.end_headers()
 
-            streamer = LogStreamer(self)
-            streamer.start()
+            last_event_id = self.headers.get('Last-Event-ID')
+            client, replay = hub.subscribe(int(last_event_id) if last_event_id and last_event_id.isdigit() else None)
+            try:
+                # Send initial connection message
+                self.send_event({
+                    "source": "system",
+                    "timestamp": datetime.now().isoformat(),
+                    "message": "Connected to log stream"
+                })
+                for event_id, data in replay:
+                    self.send_event(data, event_id)
+
+                while True:
+                    try:
+                        event = client.get(timeout=KEEPALIVE_SECONDS)
+                    except queue.Empty:
+                        # SSE comment line; also how we notice a closed tab
+                        self.wfile.write(b": keepalive\n\n")
+                        self.wfile.flush()
+                        continue
+                    if event is None:
+                        break
+                    self.send_event(event[1], event[0])
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                hub.unsubscribe(client)
         else:
             self.send_response(404)
             self.end_headers()
             self.wfile.write(b'Not Found')
 
 def run_server(port=3001):
-    server = HTTPServer(('localhost', port), LogHandler)
+    server = ThreadingHTTPServer(('localhost', port), LogHandler)
+    server.daemon_threads = True
     print(f"Starting log aggregator server on port {port}")
-    
+    start_producers()
+
     def signal_handler(sig, frame):
         print("\nShutting down server...")
         server.server_close()
-        sys.exit(0):
-    
+        sys.exit(0)
+
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
-    
+
     try:
         server.serve_forever()
     except KeyboardInterrupt:
@@ -127,4 +194,4 @@ def run_server(port=3001):
         server.server_close()
 
 if __name__ == "__main__":
-    run_server()
\ No newline at end of file
+    run_server()
@@ -1,8 +1,18 @@
+import time
 import sqlite3
 import random
+import hashlib
 import argparse
 from datetime import datetime, timedelta
 
+from db_migrate import BASE_SCHEMA, enable_wal, migrate, update_rollups, rebuild_rollups
+
+# --scale: synthetic portfolio for load-testing the dashboard
+SCALE_INSERT_CHUNK = 50000  # rows per executemany; the whole history is one transaction
+SCALE_VENDORS = ["bnhp", "hapoalim", "webtech", "ideomobile", "mfoundry", "example", "acme", "fintech"]
+SCALE_WORDS = ["pay", "trade", "portal", "wallet", "loyalty", "connect", "open", "pass", "cards", "invest",
+               "go", "mobile", "business", "kids", "pension", "mortgage"]
+
 # App pool based on the provided data
 APP_POOL = [
     ("Portal To Go", "com.webtech.mobileportal.apk", "5.5.10", "Android", 44, 5, 12, 2, 2, "./mobsf_reports/batch_2/icons/Portal_To_Go_022e9873db6afca2ca03a1a5ce4beeb2_icon.png", "./mobsf_reports/batch_2/reports/Portal_To_Go_022e9873db6afca2ca03a1a5ce4beeb2.pdf"),
@@ -19,6 +29,7 @@ APP_POOL = [
 
 def create_dummy_data(db_path, num_batches=5, scans_per_batch=5):
     conn = sqlite3.connect(db_path)
+    migrate(conn)
     cursor = conn.cursor()
 
     current_date = datetime.now()
@@ -50,18 +61,137 @@ def create_dummy_data(db_path, num_batches=5, scans_per_batch=5):
             """, (new_batch_id, batch_date.strftime("%Y-%m-%d %H:%M:%S"), app[0], app[1], app[2], app[3],
                   security_score, high_findings, warning_findings, info_findings, secure_findings,
                   app[9], app[10], batch_date.strftime("%Y-%m-%d %H:%M:%S")))
+            update_rollups(conn, cursor.lastrowid)
 
     conn.commit()
     conn.close()
 
     print(f"Added {num_batches} new batches with up to {scans_per_batch} unique scans each.")
 
+def scale_apps(rng, count, batches):
+    # Each app joins the portfolio at some point, may be retired later, and keeps a drifting score
+    apps = []
+    for n in range(count):
+        vendor, word = rng.choice(SCALE_VENDORS), rng.choice(SCALE_WORDS)
+        platform = "Android" if rng.random() < 0.6 else "iOS"
+        package = f"com.{vendor}.{word}{n}"
+        first = 0 if rng.random() < 0.5 else rng.randrange(batches)
+        last = rng.randrange(first, batches) if rng.random() < 0.15 else batches - 1
+        major, minor = rng.randint(1, 9), rng.randint(0, 20)
+        apps.append({
+            "name": f"{word.capitalize()} {vendor.capitalize()} {n}",
+            "package": package,
+            "bundle_id": package + (".apk" if platform == "Android" else ".ipa"),
+            "platform": platform,
+            "first": first,
+            "last": last,
+            "score": rng.gauss(50, 8),
+            "trend": rng.gauss(0.02, 0.05),
+            "version": [major, minor, 0],
+            "version_name": f"{major}.{minor}.0",
+            "icon": f"./mobsf_reports/objects/{hashlib.sha256(package.encode()).hexdigest()[:2]}/"
+                    f"{hashlib.sha256(package.encode()).hexdigest()}.png",
+        })
+    return apps
+
+def scale_rows(rng, apps, batch_ids, dates):
+    random_value, gauss, randint = rng.random, rng.gauss, rng.randint
+    for index, (batch_id, scan_date) in enumerate(zip(batch_ids, dates)):
+        for app in apps:
+            if not app["first"] <= index <= app["last"] or random_value() < 0.03:
+                continue
+            app["score"] = min(max(app["score"] + app["trend"] + gauss(0, 1.5), 0), 100)
+            if random_value() < 0.25:
+                version = app["version"]
+                if random_value() < 0.2:
+                    version[1:] = [version[1] + 1, 0]
+                else:
+                    version[2] += 1
+                app["version_name"] = ".".join(map(str, version))
+            score = int(app["score"])
+            noise = random_value() * 6
+            yield (batch_id, scan_date, app["name"], app["bundle_id"], app["version_name"], app["platform"], score,
+                   max(int((60 - score) / 6 + noise - 3), 0), max(int((70 - score) / 2 + noise * 2 + 2), 0),
+                   randint(1, 6), randint(0, 5), app["icon"],
+                   f"./mobsf_reports/objects/{app['package']}-{batch_id}.pdf", scan_date, app["package"])
+
+def create_scale_data(db_path, num_apps=5000, months=120, batches_per_month=2, seed=None):
+    """Years of batches over thousands of apps, bulk-inserted; returns the number of scans written."""
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    enable_wal(conn)
+    for statement in BASE_SCHEMA:
+        conn.execute(statement)
+    migrate(conn)
+    # A throwaway database: trade durability for speed while loading
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA cache_size=-200000")
+
+    now = datetime.now()
+    schedule = []
+    for month in range(months):
+        year, month_index = divmod(now.year * 12 + now.month - 1 - (months - 1 - month), 12)
+        for run in range(batches_per_month):
+            created = datetime(year, month_index + 1, 1 + run * 27 // batches_per_month, 2, 0)
+            schedule.append((f"{year:04d}-{month_index + 1:02d}", created.strftime("%Y-%m-%d %H:%M:%S")))
+
+    conn.execute("BEGIN")
+    try:
+        # Building the scans indexes once after the load is far cheaper than updating them per row
+        indexes = conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'scans' AND sql IS NOT NULL"
+        ).fetchall()
+        for name, _ in indexes:
+            conn.execute(f"DROP INDEX {name}")
+        first_batch = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM batches").fetchone()[0]
+        conn.executemany("INSERT INTO batches (id, batch_date, created_at) VALUES (?, ?, ?)",
+                         [(first_batch + n, batch_date, created) for n, (batch_date, created) in enumerate(schedule)])
+        batch_ids = range(first_batch, first_batch + len(schedule))
+        rows = scale_rows(rng, scale_apps(rng, num_apps, len(schedule)), batch_ids, [c for _, c in schedule])
+
+        written = 0
+        while True:
+            chunk = [row for _, row in zip(range(SCALE_INSERT_CHUNK), rows)]
+            if not chunk:
+                break
+            conn.executemany("""
+                INSERT INTO scans (batch_id, scan_date, app_name, bundle_id, version, platform,
+                                   security_score, high_findings, warning_findings, info_findings,
+                                   secure_findings, icon_path, pdf_path, created_at, package_name)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, chunk)
+            written += len(chunk)
+        for _, sql in indexes:
+            conn.execute(sql)
+        conn.execute("COMMIT")
+    except sqlite3.Error:
+        conn.execute("ROLLBACK")
+        raise
+
+    # One pass over scans instead of a rollup upsert per row
+    rebuild_rollups(conn)
+    conn.execute("ANALYZE")
+    conn.close()
+    return written
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Generate dummy data for MobSF database")
     parser.add_argument("db_path", help="Path to the SQLite database")
     parser.add_argument("--batches", type=int, default=5, help="Number of batches to create (default: 5)")
     parser.add_argument("--scans", type=int, default=8, help="Maximum number of scans per batch (default: 8)")
+    parser.add_argument("--scale", action="store_true",
+                        help="Generate a large synthetic history instead (creates the database if needed)")
+    parser.add_argument("--apps", type=int, default=5000, help="With --scale: distinct bundle ids (default: 5000)")
+    parser.add_argument("--months", type=int, default=120, help="With --scale: months of history (default: 120)")
+    parser.add_argument("--batches-per-month", type=int, default=2, help="With --scale: batches per month (default: 2)")
+    parser.add_argument("--seed", type=int, help="With --scale: random seed, for repeatable databases")
     
     args = parser.parse_args()
 
-    create_dummy_data(args.db_path, args.batches, args.scans)
+    if args.scale:
+        start = time.perf_counter()
+        count = create_scale_data(args.db_path, args.apps, args.months, args.batches_per_month, args.seed)
+        print(f"Added {args.months * args.batches_per_month} batches with {count} scans of {args.apps} apps "
+              f"in {time.perf_counter() - start:.1f}s.")
+    else:
+        create_dummy_data(args.db_path, args.batches, args.scans)
@@ -1,40 +1,249 @@
 import os
 import sqlite3
 import shutil
+import argparse
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from db_migrate import migrate, refresh_latest_scan
+from artifact_store import OBJECTS_DIR, gc
 
 # Configuration
 DB_PATH = "mobsf_scans.db"
 REPORTS_BASE_DIR = "mobsf_reports"
+PRUNE_CHUNK_ROWS = 500  # scans deleted per transaction, so dashboard readers never wait long on the lock
+VACUUM_STEP_PAGES = 1000  # pages returned to the filesystem per incremental_vacuum call
+FOLDER_WORKERS = 8
+
+# Rows that belong to a batch, besides the batch itself: (table, column holding the batch id)
+BATCH_TABLES = [("batch_summary", "batch_id"), ("scan_progress", "batch_id"),
+                ("batch_stage_timings", "batch_id"), ("batch_runs", "batch_id")]
 
 def clear_database():
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
-    
+
     # Clear all tables
     cursor.execute("DELETE FROM scans")
     cursor.execute("DELETE FROM batches")
-    
+    for table in ("batch_summary", "latest_scans", "scan_findings", "scan_timings", "scan_progress",
+                  "batch_stage_timings", "batch_runs"):
+        if cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone():
+            cursor.execute(f"DELETE FROM {table}")
+
     conn.commit()
     conn.close()
     print("Database cleared.")
 
-def remove_batch_folders():
-    for item in os.listdir(REPORTS_BASE_DIR):
-        item_path = os.path.join(REPORTS_BASE_DIR, item)
-        if os.path.isdir(item_path) and item.startswith("batch_"):
-            shutil.rmtree(item_path)
-            print(f"Removed folder: {item}")
+def batch_folders(batch_ids=None):
+    if not os.path.isdir(REPORTS_BASE_DIR):
+        return []
+    wanted = None if batch_ids is None else {f"batch_{batch_id}" for batch_id in batch_ids}
+    return [os.path.join(REPORTS_BASE_DIR, item) for item in os.listdir(REPORTS_BASE_DIR)
+            if item.startswith("batch_") and os.path.isdir(os.path.join(REPORTS_BASE_DIR, item))
+            and (wanted is None or item in wanted)]
+
+def remove_batch_folders(batch_ids=None):
+    # rmtree is mostly waiting on the filesystem, so several folders go at once
+    folders = batch_folders(batch_ids)
+    with ThreadPoolExecutor(max_workers=FOLDER_WORKERS) as executor:
+        for folder in executor.map(lambda folder: shutil.rmtree(folder) or folder, folders):
+            print(f"Removed folder: {os.path.basename(folder)}")
+
+def folder_bytes(folder):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(folder) for name in names)
+
+def batches_to_prune(conn, keep_last=None, keep_months=None):
+    batches = conn.execute("SELECT id, batch_date FROM batches ORDER BY id DESC").fetchall()
+    # The newest batch is always kept; it may still be running or about to be resumed
+    keep = {batches[0][0]} if batches else set()
+    if keep_last:
+        keep.update(batch_id for batch_id, _ in batches[:keep_last])
+    if keep_months:
+        # Newest batch of each of the last keep_months months, counting the current one
+        now = datetime.date.today()
+        first = now.year * 12 + now.month - 1 - (keep_months - 1)
+        cutoff = f"{first // 12:04d}-{first % 12 + 1:02d}"
+        months = set()
+        for batch_id, batch_date in batches:
+            if batch_date and batch_date[:7] >= cutoff and batch_date[:7] not in months:
+                keep.add(batch_id)
+                months.add(batch_date[:7])
+    return [batch_id for batch_id, _ in reversed(batches) if batch_id not in keep]
+
+def table_bytes(conn):
+    # Page usage per table and index; not every SQLite build has dbstat
+    try:
+        return dict(conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name").fetchall())
+    except sqlite3.Error:
+        return None
+
+def prune_plan(conn, batch_ids):
+    """Rows, artifact bytes and approximate database bytes that pruning batch_ids would free."""
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS prune_batches (id INTEGER PRIMARY KEY)")
+    conn.execute("DELETE FROM prune_batches")
+    conn.executemany("INSERT INTO prune_batches (id) VALUES (?)", [(batch_id,) for batch_id in batch_ids])
+
+    rows = {
+        "batches": len(batch_ids),
+        "scans": conn.execute("SELECT COUNT(*) FROM scans WHERE batch_id IN prune_batches").fetchone()[0],
+        "scan_findings": conn.execute("""
+            SELECT COUNT(*) FROM scan_findings
+            WHERE scan_id IN (SELECT id FROM scans WHERE batch_id IN prune_batches)
+        """).fetchone()[0],
+    }
+    for table, column in BATCH_TABLES:
+        rows[table] = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {column} IN prune_batches").fetchone()[0]
+
+    # Stored objects only the pruned scans refer to
+    pruned = {path for row in conn.execute("SELECT icon_path, pdf_path FROM scans WHERE batch_id IN prune_batches")
+              for path in row if path}
+    kept = {path for row in conn.execute("""
+                SELECT icon_path, pdf_path FROM scans WHERE batch_id NOT IN prune_batches
+                UNION ALL
+                SELECT icon_path, pdf_path FROM scan_cache
+            """) for path in row if path}
+    objects_dir = os.path.normpath(OBJECTS_DIR)
+    orphaned = {os.path.normpath(path) for path in pruned} - {os.path.normpath(path) for path in kept}
+    object_bytes = sum(os.path.getsize(path) for path in orphaned
+                       if path.startswith(objects_dir + os.sep) and os.path.exists(path))
+    folders = sum(folder_bytes(folder) for folder in batch_folders(batch_ids))
+
+    db_bytes = None
+    sizes = table_bytes(conn)
+    if sizes is not None:
+        db_bytes = 0
+        for table in ("scans", "scan_findings", "batches") + tuple(table for table, _ in BATCH_TABLES):
+            total = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            if total:
+                db_bytes += int(sizes.get(table, 0) * rows[table] / total)
+    return rows, object_bytes + folders, db_bytes
+
+def delete_batch(conn, batch_id):
+    # A chunk of scans per transaction, then the batch row itself once it has no scans left
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ids = [row[0] for row in conn.execute("SELECT id FROM scans WHERE batch_id = ? LIMIT ?",
+                                                  (batch_id, PRUNE_CHUNK_ROWS))]
+            if ids:
+                marks = ",".join("?" * len(ids))
+                conn.execute(f"DELETE FROM scan_findings WHERE scan_id IN ({marks})", ids)
+                stale = [row[0] for row in conn.execute(
+                    f"SELECT bundle_id FROM latest_scans WHERE scan_id IN ({marks})", ids)]
+                conn.execute(f"DELETE FROM scans WHERE id IN ({marks})", ids)
+                for bundle_id in stale:
+                    refresh_latest_scan(conn, bundle_id)
+            else:
+                for table, column in BATCH_TABLES:
+                    conn.execute(f"DELETE FROM {table} WHERE {column} = ?", (batch_id,))
+                conn.execute("DELETE FROM batches WHERE id = ?", (batch_id,))
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        if not ids:
+            return
+
+def incremental_vacuum(conn):
+    # Only databases created or VACUUMed with auto_vacuum=INCREMENTAL can give pages back piecemeal
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return None
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    freed = 0
+    while True:
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if not free_pages:
+            return freed * page_size
+        conn.execute(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})").fetchall()
+        freed += min(free_pages, VACUUM_STEP_PAGES)
+
+def enable_incremental_vacuum(conn):
+    # One full rewrite; afterwards every prune can return space with incremental_vacuum
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+def format_bytes(num_bytes):
+    return f"{num_bytes / 1024 / 1024:.1f} MB"
+
+def print_plan(batch_ids, rows, file_bytes, db_bytes, dry_run):
+    verb = "Would" if dry_run else "Will"
+    print(f"{verb} prune {len(batch_ids)} batches: {', '.join(map(str, batch_ids)) or 'none'}")
+    print(f"{verb} delete rows: " + ", ".join(f"{table} {count}" for table, count in rows.items()))
+    print(f"{verb} free {format_bytes(file_bytes)} of reports and icons"
+          + (f" and about {format_bytes(db_bytes)} of database pages" if db_bytes is not None else ""))
+
+def prune(keep_last=None, keep_months=None, dry_run=False, assume_yes=False, vacuum_setup=False):
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    try:
+        migrate(conn)
+        batch_ids = batches_to_prune(conn, keep_last, keep_months)
+        rows, file_bytes, db_bytes = prune_plan(conn, batch_ids)
+        print_plan(batch_ids, rows, file_bytes, db_bytes, dry_run)
+        if dry_run or not batch_ids:
+            return
+        if not assume_yes and input("Are you sure you want to proceed? (yes/no): ").lower() != "yes":
+            print("Operation cancelled.")
+            return
+
+        for batch_id in batch_ids:
+            delete_batch(conn, batch_id)
+            print(f"Deleted batch {batch_id}")
+        remove_batch_folders(batch_ids)
+        removed, freed = gc(DB_PATH)
+        print(f"Removed {removed} unreferenced stored objects ({format_bytes(freed)}).")
+
+        if vacuum_setup:
+            enable_incremental_vacuum(conn)
+            print("Database rewritten with auto_vacuum=INCREMENTAL.")
+        else:
+            freed = incremental_vacuum(conn)
+            if freed is None:
+                print("Database pages were freed but not returned to the filesystem; "
+                      "run once with --enable-incremental-vacuum to allow that.")
+            else:
+                print(f"Incremental vacuum returned {format_bytes(freed)} to the filesystem.")
+    finally:
+        conn.close()
 
 def main():
+    parser = argparse.ArgumentParser(
+        description="Delete old MobSF batches. Without a retention policy, clears everything.")
+    parser.add_argument("--keep-last", type=int, metavar="N", help="Keep the N most recent batches")
+    parser.add_argument("--keep-months", type=int, metavar="N",
+                        help="Keep the newest batch of each of the last N months (e.g. 12 for a yearly history)")
+    parser.add_argument("--dry-run", action="store_true", help="Only report the rows and bytes that would be freed")
+    parser.add_argument("--yes", action="store_true", help="Do not ask for confirmation")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="After pruning, rewrite the database once so later prunes can shrink the file")
+
+    args = parser.parse_args()
+
+    if args.keep_last is not None or args.keep_months is not None:
+        prune(args.keep_last, args.keep_months, args.dry_run, args.yes, args.enable_incremental_vacuum)
+        return
+
+    if args.dry_run:
+        conn = sqlite3.connect(DB_PATH, isolation_level=None)
+        try:
+            migrate(conn)
+            batch_ids = [row[0] for row in conn.execute("SELECT id FROM batches ORDER BY id")]
+            print_plan(batch_ids, *prune_plan(conn, batch_ids), True)
+        finally:
+            conn.close()
+        return
+
     print("Warning: This script will clear all data from the database and remove all batch folders.")
-    confirmation = input("Are you sure you want to proceed? (yes/no): ")
-    
+    confirmation = "yes" if args.yes else input("Are you sure you want to proceed? (yes/no): ")
+
     if confirmation.lower() != "yes":
         print("Operation cancelled.")
         return
-    
+
     clear_database()
     remove_batch_folders()
+    removed, freed = gc(DB_PATH)
+    print(f"Removed {removed} unreferenced stored objects ({format_bytes(freed)}).")
     print("Clean-up completed successfully.")
 
 if __name__ == "__main__":
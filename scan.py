@@ -6,20 +6,186 @@ import sqlite3
 import requests
 import datetime
 import json
-from requests_toolbelt.multipart.encoder import MultipartEncoder
-from bs4 import BeautifulSoup
+import argparse
+import threading
+import logging
+import logging.handlers
+import atexit
+import queue
+import time
+import hashlib
+import random
+import heapq
+import mmap
+import select
+import signal
+import struct
+import ctypes
+import ctypes.util
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from db_migrate import enable_wal, migrate, update_rollups
+from findings import store_findings
+from artifact_store import store_chunks
+from app_metadata import read_metadata
+from metrics import Registry, start_server
 
 # Configuration
 SCAN_DIR = "./mobile_apps"
-MOBSF_HOST = sys.argv[1]
-MOBSF_API_KEY = sys.argv[2]
-USERNAME = sys.argv[3]
-PASSWORD = sys.argv[4]
+MOBSF_HOST = None
+MOBSF_API_KEY = None
+USERNAME = None
+PASSWORD = None
 DB_PATH = "mobsf_scans.db"
 LOG_FILE = "mobsf_scans.log"
+SESSION_CACHE = ".mobsf_session.json"  # MobSF login cookies, reused by later runs until MobSF rejects them
+LOG_LEVEL = "INFO"
+LOG_FORMAT = "json"  # format of LOG_FILE: "json" (one JSON object per line) or "text" (same as the console)
+LOG_MAX_BYTES = 50 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
 REPORTS_BASE_DIR = "./mobsf_reports"
+DB_TIMEOUT = 30  # seconds to wait on a locked database when several workers insert at once
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+UPLOAD_PROGRESS_STEP = 25  # log upload progress every N percent
+LOG_PREVIEW_BYTES = 512  # cap on response bodies written to DEBUG lines
+USE_CACHE = True  # reuse earlier results for binaries whose MD5 is already in scan_cache
+CACHE_VERSION = None  # only reuse cache entries produced by this MobSF version (e.g. v4.2.9)
+SCAN_START_TIMEOUT = 10  # seconds to wait on /api/v1/scan before leaving the analysis to the poller
+SCAN_POLL_MIN = 1.0
+SCAN_POLL_MAX = 15.0
+SCAN_MAX_WAIT = 60 * 60  # give up on an analysis that has not finished after this many seconds
+SCAN_SECONDS_PER_MB = 2.0  # analysis time estimate when scan_timings has no history to learn it from
+SCAN_POLL_BACKOFF = 1.5  # polling interval growth per poll once a scan runs past its expected duration
+SCAN_POLL_LATE_SHARE = 0.1  # ...capped at this share of the time already spent, bounding how late a finish is seen
+SCAN_DONE_STATUS = "Saving to Database"
+INSTANCE_MAX_FAILURES = 3  # consecutive MobSF-side failures before new uploads to a host are paused
+INSTANCE_WAIT_MAX = 30 * 60  # an app that has waited this long for a usable MobSF instance is failed
+CONCURRENCY_DECREASE_INTERVAL = 5.0  # seconds between halvings, so one burst of errors only counts once
+LATENCY_ENDPOINTS = ("/api/v1/scorecard", "/api/v1/scan_logs")  # cheap calls whose latency tracks MobSF load
+LATENCY_SLOWDOWN = 3.0  # these calls taking this many times their usual latency count as overload
+LATENCY_FLOOR = 1.0  # seconds; faster responses never count as overload
+BREAKER_COOLDOWN = 15.0  # seconds new uploads are paused when the breaker opens; doubles while MobSF stays down
+BREAKER_MAX_COOLDOWN = 300.0
+API_TIMEOUT = (10, 120)  # (connect, read) seconds for scorecard and PDF requests
+RETRY_STAGES = ("upload", "scan", "scorecard", "icon", "pdf")  # idempotent: MobSF keys everything by the file's MD5
+STAGE_RETRIES = 3  # extra attempts at a stage that hit a timeout, connection error or 5xx
+RETRY_BASE_DELAY = 2.0
+RETRY_MAX_DELAY = 60.0
+WATCH_DIRS = [SCAN_DIR, "./manual_ipa_uploads"]  # folders scan.py --watch picks new apps up from
+WATCH_DEBOUNCE = 10  # seconds a file must go unmodified before it is treated as fully written
+WATCH_SWEEP_INTERVAL = 60  # full re-listing of the watched folders, and the only source without inotify
+SCHEDULE_HISTORY = 200  # most recent full scans used to learn seconds per MB for apps never timed before
+SCHEDULE_MIN_SECONDS = 5.0  # floor on the predicted duration of an app without its own history
+HASH_SECONDS_PER_MB = 0.01  # predicted cost of an unchanged binary that will be served from scan_cache
+METRICS_HOST = "127.0.0.1"  # the metrics endpoint is only meant for a local Prometheus agent or curl
+METRICS_PORT = 9108  # http://METRICS_HOST:METRICS_PORT/metrics while scan.py runs; 0 turns it off
+
+# Default concurrency per pipeline stage (--pipeline). Upload is bandwidth-bound,
+# scan is MobSF CPU-bound, pdf is PDF rendering (wkhtmltopdf) bound.
+STAGE_WORKERS = {
+    "cache": 2,
+    "upload": 2,
+    "scan": 2,
+    "scorecard": 2,
+    "icon": 2,
+    "pdf": 2,
+    "store": 1,
+}
+
+DB_WRITE_BATCH = 100  # max queued writes committed together in one transaction
+
+LOG_CONTEXT = {"batch_id": None}
+
+logger = logging.getLogger("mobsf_scan")
+_log_listener = None
+_log_setup_lock = threading.Lock()
+_worker_state = threading.local()
+_db_writer = None
+_db_writer_lock = threading.Lock()
+_scan_poller = None
+_scan_poller_lock = threading.Lock()
+_app_metadata = {}
+_app_metadata_lock = threading.Lock()
+_file_hashes = {}
+_file_hashes_lock = threading.Lock()
+_session_cache_lock = threading.Lock()
+
+metrics = Registry()
+metrics.describe("mobsf_batch_id", "gauge", "Batch this run is scanning into")
+metrics.describe("mobsf_apps_queued_total", "counter", "Apps handed to the workers")
+metrics.describe("mobsf_apps_total", "counter", "Apps finished, by outcome (scanned, cached or failed)")
+metrics.describe("mobsf_apps_in_flight", "gauge", "Apps currently holding a slot on a MobSF instance")
+metrics.describe("mobsf_concurrency_limit", "gauge", "Current AIMD concurrency limit of a MobSF instance")
+metrics.describe("mobsf_breaker_paused_seconds", "gauge", "Seconds until a MobSF instance with an open breaker takes new uploads")
+metrics.describe("mobsf_stage_seconds", "histogram", "Time an app spent in a stage, retries included")
+metrics.describe("mobsf_stage_runs_total", "counter", "Stage runs, by outcome")
+metrics.describe("mobsf_stage_retries_total", "counter", "Stage attempts retried after a MobSF-side failure")
+metrics.describe("mobsf_request_seconds", "histogram", "MobSF response time until the headers arrived, by endpoint")
+metrics.describe("mobsf_responses_total", "counter", "MobSF responses, by status code")
+metrics.describe("mobsf_instance_failures_total", "counter", "5xx responses, timeouts and connection errors per instance")
+metrics.describe("mobsf_bytes_total", "counter", "Bytes sent to or received from MobSF, by artifact")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk scan mobile apps with MobSF")
+    parser.add_argument("mobsf_host", help="MobSF base URL, e.g. http://localhost:8000")
+    parser.add_argument("mobsf_api_key", help="MobSF REST API key")
+    parser.add_argument("username", help="MobSF web login username")
+    parser.add_argument("password", help="MobSF web login password")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of apps to scan concurrently (default: 1)")
+
+    parser.add_argument("--instance", nargs=4, action="append", default=[],
+                        metavar=("HOST", "API_KEY", "USERNAME", "PASSWORD"),
+                        help="Additional MobSF instance to spread the batch across (repeatable)")
+    parser.add_argument("--log-level", default=LOG_LEVEL, choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help=f"Minimum level written to the console and {LOG_FILE} (default: {LOG_LEVEL})")
+    parser.add_argument("--log-format", default=LOG_FORMAT, choices=["json", "text"],
+                        help=f"Format of {LOG_FILE} (default: {LOG_FORMAT}); the console is always plain text")
+    parser.add_argument("--log-max-bytes", type=int, default=LOG_MAX_BYTES,
+                        help=f"Rotate {LOG_FILE} once it reaches this size (default: {LOG_MAX_BYTES})")
+    parser.add_argument("--rescan", action="store_true",
+                        help="Ignore the local scan cache and re-upload every binary (e.g. after a MobSF upgrade)")
+    parser.add_argument("--cache-version", metavar="MOBSF_VERSION",
+                        help="Only reuse cached results produced by this MobSF version, e.g. v4.2.9")
+    parser.add_argument("--resume", type=int, metavar="BATCH_ID",
+                        help="Continue an interrupted batch, skipping apps it already stored")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Overlap upload, scan and artifact download across apps with a queue per stage")
+    parser.add_argument("--stage-workers", action="append", default=[], metavar="STAGE=N",
+                        help="Concurrency limit for a pipeline stage, e.g. --stage-workers scan=3 "
+                             f"(stages: {', '.join(STAGE_WORKERS)})")
+    parser.add_argument("--skip-scanned-versions", action="store_true",
+                        help="Skip apps whose bundle id and version were already scanned, instead of scanning them last; "
+                             "skipped apps get no row in this batch")
+    parser.add_argument("--watch", action="store_true",
+                        help=f"Keep running and scan new or changed apps in {' and '.join(WATCH_DIRS)} "
+                             "into this month's batch")
+    parser.add_argument("--fresh-login", action="store_true",
+                        help=f"Log in to MobSF again instead of reusing the cookies cached in {SESSION_CACHE}")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT, metavar="PORT",
+                        help=f"Serve Prometheus metrics on http://{METRICS_HOST}:PORT/metrics "
+                             f"(default: {METRICS_PORT}; 0 disables)")
+
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.watch and (args.resume or args.pipeline):
+        parser.error("--watch cannot be combined with --resume or --pipeline")
+
+    args.stage_workers_limits = dict(STAGE_WORKERS)
+    for spec in args.stage_workers:
+        stage, _, count = spec.partition("=")
+        if stage not in STAGE_WORKERS or not count.isdigit() or int(count) < 1:
+            parser.error(f"Invalid --stage-workers value: {spec}")
+        args.stage_workers_limits[stage] = int(count)
+    return args
 
 def login_to_mobsf(host, username, password):
+    # Only a fresh login parses HTML; runs that reuse cached cookies never import bs4
+    from bs4 import BeautifulSoup
+
     session = requests.Session()
     
     # Get the login page to retrieve the CSRF token
@@ -44,276 +210,1723 @@ def login_to_mobsf(host, username, password):
     
     return session
 
-def log(level, message):
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"[{timestamp}] [{level}] {message}", flush=True)
-    with open(LOG_FILE, "a") as f:
-        f.write(f"[{timestamp}] [{level}] {message}\n")
+def load_session_cache():
+    try:
+        with open(SESSION_CACHE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_session_cookies(host, username, session):
+    with _session_cache_lock:
+        cache = load_session_cache()
+        cache[f"{username}@{host}"] = session.cookies.get_dict()
+        # The cookies are as good as the password, so only the owner may read the file
+        tmp_path = SESSION_CACHE + ".part"
+        with os.fdopen(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, SESSION_CACHE)
+
+def cached_session(host, username):
+    # A session from the cached cookies, if MobSF still serves its index page with them instead of the login page
+    cookies = load_session_cache().get(f"{username}@{host}")
+    if not cookies:
+        return None
+    session = requests.Session()
+    session.cookies.update(cookies)
+    try:
+        response = session.get(f"{host}/", allow_redirects=False, timeout=API_TIMEOUT)
+    except requests.exceptions.RequestException:
+        return None
+    return session if response.status_code == 200 else None
+
+def open_session(host, username, password, fresh=False):
+    session = None if fresh else cached_session(host, username)
+    if session is not None:
+        log("INFO", "Reusing cached MobSF session for %s", host)
+        return session
+    session = login_to_mobsf(host, username, password)
+    save_session_cookies(host, username, session)
+    return session
+
+class SessionExpired(Exception):
+    """MobSF answered a request that needs the login cookie with its login page."""
+
+def check_login(response, *args, **kwargs):
+    # requests response hook: Django's login_required redirects web pages to /login/ once the session expires.
+    # The REST API only checks the API key, so its 401s are not about the session.
+    path = urllib.parse.urlparse(response.url).path
+    if path.startswith(("/api/", "/login/")):
+        return
+    location = urllib.parse.urlparse(response.headers.get("Location", "")).path
+    if (response.is_redirect and location.startswith("/login/")) or response.status_code in (401, 403):
+        raise SessionExpired(f"MobSF session expired (HTTP {response.status_code} for {path})")
+
+def relogin(instance, session):
+    # One fresh login per expiry: workers that hit it while another one logs in just pick up the new cookies
+    with instance["login_lock"]:
+        shared = instance["session"]
+        if shared.cookies.get_dict().get("sessionid") == session.cookies.get_dict().get("sessionid"):
+            username, password = instance["credentials"]
+            fresh = login_to_mobsf(instance["host"], username, password)
+            shared.cookies.clear()
+            shared.cookies.update(fresh.cookies)
+            save_session_cookies(instance["host"], username, shared)
+            log("INFO", "Logged in to MobSF at %s again after the session expired", instance["host"])
+        session.cookies.clear()
+        session.cookies.update(shared.cookies)
+
+def clone_session(session):
+    # Each worker gets its own Session so cookies and headers are not shared across threads;
+    # the adapters, and with them the instance's pool of keep-alive connections, are
+    worker_session = requests.Session()
+    worker_session.cookies.update(session.cookies)
+    worker_session.headers.update(session.headers)
+    worker_session.hooks["response"] = list(session.hooks["response"])
+    for prefix, adapter in session.adapters.items():
+        worker_session.mount(prefix, adapter)
+    return worker_session
+
+def get_worker_session(session):
+    # One clone per thread per MobSF instance login
+    sessions = getattr(_worker_state, "sessions", None)
+    if sessions is None:
+        sessions = _worker_state.sessions = {}
+    if id(session) not in sessions:
+        sessions[id(session)] = clone_session(session)
+    return sessions[id(session)]
+
+class JSONLinesFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps({
+            "timestamp": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "batch_id": getattr(record, "batch_id", None),
+            "file": getattr(record, "file", None),
+            "scan_hash": getattr(record, "scan_hash", None),
+            "stage": getattr(record, "stage", None),
+            "message": record.getMessage(),
+        }, ensure_ascii=False)
+
+def setup_logging(level=None, log_format=None, max_bytes=None, backup_count=None):
+    # Callers only enqueue records; a background listener thread formats and writes them
+    global _log_listener
+    with _log_setup_lock:
+        if _log_listener is not None:
+            _log_listener.stop()
+
+        text_formatter = logging.Formatter("[%(asctime)s] [%(levelname)s] %(message)s", "%Y-%m-%d %H:%M:%S")
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(text_formatter)
+        file_handler = logging.handlers.RotatingFileHandler(
+            LOG_FILE,
+            maxBytes=max_bytes or LOG_MAX_BYTES,
+            backupCount=backup_count or LOG_BACKUP_COUNT,
+            encoding="utf-8"
+        )
+        file_handler.setFormatter(JSONLinesFormatter() if (log_format or LOG_FORMAT) == "json" else text_formatter)
+
+        log_queue = queue.SimpleQueue()
+        logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+        logger.setLevel(level or LOG_LEVEL)
+        logger.propagate = False
+        _log_listener = logging.handlers.QueueListener(log_queue, console_handler, file_handler)
+        _log_listener.start()
+    atexit.register(shutdown_logging)
+
+def shutdown_logging():
+    # Flush everything still queued before the process exits
+    global _log_listener
+    with _log_setup_lock:
+        if _log_listener is not None:
+            _log_listener.stop()
+            _log_listener = None
+
+def log(level, message, *args, app=None):
+    # args are %-formatted only if the record is emitted, so DEBUG calls cost nothing at INFO
+    if _log_listener is None:
+        setup_logging()
+    levelno = logging.getLevelName(level)
+    if not logger.isEnabledFor(levelno):
+        return
+    app = app or getattr(_worker_state, "app", None)
+    logger.log(levelno, message, *args, extra={
+        "batch_id": LOG_CONTEXT["batch_id"],
+        "file": os.path.basename(app["file"]) if app else None,
+        "scan_hash": app["scan_hash"] if app else None,
+        "stage": getattr(_worker_state, "stage", None),
+    })
+
+class DBWriter:
+    """Single long-lived SQLite connection that every scan thread writes through.
+
+    Jobs are callables taking the connection. Whatever is queued when the writer
+    wakes up is committed in one transaction, each job inside its own savepoint
+    so a failing job does not roll back its neighbours.
+    """
+
+    def __init__(self, db_path, max_batch=DB_WRITE_BATCH):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.jobs = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, fn):
+        job = {"fn": fn, "done": threading.Event(), "result": None, "error": None}
+        self.jobs.put(job)
+        job["done"].wait()
+        if job["error"] is not None:
+            raise job["error"]
+        return job["result"]
+
+    def close(self):
+        self.jobs.put(None)
+        self.thread.join()
+
+    def _run(self):
+        conn = sqlite3.connect(self.db_path, timeout=DB_TIMEOUT, isolation_level=None, check_same_thread=False)
+        enable_wal(conn)
+        running = True
+        while running:
+            job = self.jobs.get()
+            if job is None:
+                break
+            batch = [job]
+            while len(batch) < self.max_batch:
+                try:
+                    job = self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    running = False
+                    break
+                batch.append(job)
+            self._commit(conn, batch)
+        conn.close()
+
+    def _commit(self, conn, batch):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for job in batch:
+                conn.execute("SAVEPOINT job")
+                try:
+                    job["result"] = job["fn"](conn)
+                    conn.execute("RELEASE job")
+                except Exception as e:
+                    # Any error, not only sqlite3's, must leave the transaction usable for the other jobs
+                    conn.execute("ROLLBACK TO job")
+                    conn.execute("RELEASE job")
+                    job["error"] = e
+            conn.execute("COMMIT")
+        except Exception as e:
+            # The whole batch is rolled back, so every job in it failed; the writer thread carries on
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for job in batch:
+                job["result"] = None
+                job["error"] = job["error"] or e
+        finally:
+            for job in batch:
+                job["done"].set()
+
+def get_db_writer():
+    global _db_writer
+    with _db_writer_lock:
+        if _db_writer is None:
+            _db_writer = DBWriter(DB_PATH)
+        return _db_writer
+
+def close_db_writer():
+    global _db_writer
+    with _db_writer_lock:
+        if _db_writer is not None:
+            _db_writer.close()
+            _db_writer = None
+
+class ScanPoller:
+    """Tracks every in-flight MobSF analysis from a single thread via /api/v1/scan_logs.
+
+    Polls get more frequent as a scan approaches the duration expected for its
+    file size, which is learned from earlier runs' scan_timings and then from the
+    scans this run finishes. Past that point the interval backs off again, since a
+    scan that overran its estimate is usually a slow one.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.scans = []
+        self.seconds_per_mb = history_scan_seconds_per_mb()
+        self.thread = threading.Thread(target=self._run, name="scan-poller", daemon=True)
+        self.thread.start()
+
+    def expected_duration(self, size):
+        with self.lock:
+            return max(size / 1024 / 1024 * self.seconds_per_mb, SCAN_POLL_MIN)
+
+    def record(self, size, seconds):
+        # Exponentially weighted average so the estimate follows the current MobSF load
+        if size <= 0:
+            return
+        with self.lock:
+            self.seconds_per_mb = 0.7 * self.seconds_per_mb + 0.3 * seconds / (size / 1024 / 1024)
+
+    def wait(self, app, session, started):
+        size = os.path.getsize(app["file"])
+        entry = {
+            "app": app,
+            "session": session,
+            "size": size,
+            "started": started,
+            "expected": self.expected_duration(size),
+            "next_poll": time.monotonic(),
+            "interval": SCAN_POLL_MIN,
+            "poll_errors": 0,
+            "done": threading.Event(),
+            "error": None,
+        }
+        entry["next_poll"] = started + self._interval(entry, time.monotonic())
+        with self.lock:
+            self.scans.append(entry)
+        self.wakeup.set()
+
+        # Backstop in case the poller thread stops answering: fail the app rather than hang the batch
+        if not entry["done"].wait(timeout=SCAN_MAX_WAIT + 2 * SCAN_POLL_MAX):
+            self._finish(entry, requests.exceptions.Timeout(f"MobSF analysis did not finish within {SCAN_MAX_WAIT}s"))
+        if entry["error"] is not None:
+            raise entry["error"]
+
+    def _interval(self, entry, now):
+        remaining = entry["expected"] - (now - entry["started"])
+        if remaining > 0:
+            interval = remaining / 4
+        else:
+            interval = min(entry["interval"] * SCAN_POLL_BACKOFF, (now - entry["started"]) * SCAN_POLL_LATE_SHARE)
+        entry["interval"] = min(max(interval, SCAN_POLL_MIN), SCAN_POLL_MAX)
+        return entry["interval"]
+
+    def _finish(self, entry, error=None):
+        with self.lock:
+            if entry not in self.scans:
+                return
+            self.scans.remove(entry)
+            entry["error"] = error
+        entry["done"].set()
+
+    def _run(self):
+        while True:
+            now = time.monotonic()
+            with self.lock:
+                due = [entry for entry in self.scans if entry["next_poll"] <= now]
+            for entry in due:
+                try:
+                    self._poll(entry)
+                except Exception as e:
+                    # One unexpected reply must not take down the thread every in-flight app is waiting on
+                    log("ERROR", "Polling scan %s failed: %s", entry["app"].get("scan_hash"), e, app=entry["app"])
+                    self._finish(entry, e)
+
+            with self.lock:
+                next_poll = min((entry["next_poll"] for entry in self.scans), default=now + SCAN_POLL_MAX)
+            self.wakeup.wait(timeout=max(next_poll - time.monotonic(), 0))
+            self.wakeup.clear()
+
+    def _poll(self, entry):
+        app = entry["app"]
+        now = time.monotonic()
+        try:
+            resp = entry["session"].post(f"{app['host']}/api/v1/scan_logs", data={"hash": app["scan_hash"]}, timeout=30)
+            resp.raise_for_status()
+            payload = resp.json()
+            logs = payload.get("logs", []) if isinstance(payload, dict) else None
+            if not isinstance(logs, list) or not all(isinstance(line, dict) for line in logs):
+                raise ValueError(f"Unexpected scan_logs response: {str(payload)[:200]}")
+        except (requests.exceptions.RequestException, ValueError) as e:
+            report_failure(app, e)
+            entry["poll_errors"] += 1
+            if entry["poll_errors"] >= 5:
+                self._finish(entry, e)
+            else:
+                entry["next_poll"] = now + SCAN_POLL_MAX
+            return
+
+        entry["poll_errors"] = 0
+        last = logs[-1] if logs else {}
+        elapsed = now - entry["started"]
+        if last.get("exception"):
+            self._finish(entry, Exception(f"MobSF analysis failed at '{last.get('status')}': {last['exception']}"))
+        elif SCAN_DONE_STATUS in (last.get("status") or ""):
+            log("DEBUG", "Scan for %s reached '%s' after %.1fs", app["scan_hash"], SCAN_DONE_STATUS, elapsed, app=app)
+            self.record(entry["size"], elapsed)
+            self._finish(entry)
+        elif elapsed > SCAN_MAX_WAIT:
+            self._finish(entry, requests.exceptions.Timeout(f"MobSF analysis did not finish within {SCAN_MAX_WAIT}s"))
+        else:
+            entry["next_poll"] = now + self._interval(entry, now)
+
+def history_scan_seconds_per_mb():
+    # MobSF analysis time per MB over the recent full scans, from the scan stage of scan_timings
+    try:
+        seconds, size = db_query("""
+            SELECT TOTAL(scan_seconds), TOTAL(file_size) FROM (
+                SELECT json_extract(stages, '$.scan') AS scan_seconds, file_size FROM scan_timings
+                WHERE succeeded = 1 AND cached = 0 AND resumed = 0 AND json_extract(stages, '$.scan') IS NOT NULL
+                ORDER BY id DESC LIMIT ?
+            )
+        """, (SCHEDULE_HISTORY,))[0]
+    except sqlite3.Error as e:
+        log("WARNING", "Cannot read scan timing history: %s", e)
+        return SCAN_SECONDS_PER_MB
+    return seconds / (size / 1024 / 1024) if size else SCAN_SECONDS_PER_MB
+
+def get_scan_poller():
+    global _scan_poller
+    with _scan_poller_lock:
+        if _scan_poller is None:
+            _scan_poller = ScanPoller()
+        return _scan_poller
 
 def create_batch():
     batch_date = datetime.datetime.now().strftime("%Y-%m")
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("INSERT INTO batches (batch_date) VALUES (?)", (batch_date,))
-    batch_id = c.lastrowid
-    conn.commit()
-    conn.close()
+    batch_id = get_db_writer().submit(
+        lambda conn: conn.execute("INSERT INTO batches (batch_date) VALUES (?)", (batch_date,)).lastrowid
+    )
 
     batch_dir = os.path.join(REPORTS_BASE_DIR, f"batch_{batch_id}")
-    os.makedirs(os.path.join(batch_dir, "reports"), exist_ok=True)
-    os.makedirs(os.path.join(batch_dir, "icons"), exist_ok=True)
+    os.makedirs(batch_dir, exist_ok=True)
 
     return batch_id, batch_dir
 
-def db_execute(query, values):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+def ensure_schema():
+    conn = sqlite3.connect(DB_PATH, timeout=DB_TIMEOUT, isolation_level=None)
     try:
-        c.execute(query, values)
-        conn.commit()
-    except sqlite3.Error as e:
-        log("ERROR", f"Database error: {e}")
-        return False
+        enable_wal(conn)
+        migrate(conn)
     finally:
         conn.close()
+
+def db_query(query, values=()):
+    # Reads use a per-thread connection; with WAL they never block on the writer
+    conn = getattr(_worker_state, "db_conn", None)
+    if conn is None:
+        conn = _worker_state.db_conn = sqlite3.connect(DB_PATH, timeout=DB_TIMEOUT)
+    return conn.execute(query, values).fetchall()
+
+def db_transaction(fn):
+    try:
+        get_db_writer().submit(fn)
+    except sqlite3.Error as e:
+        log("ERROR", "Database error: %s", e)
+        return False
     return True
 
-def save_icon(session, scan_hash, app_name, batch_dir):
-    log("DEBUG", f"Saving icon for app: {app_name}, scan hash: {scan_hash}, batch dir: {batch_dir}")
-    
+def db_execute(query, values):
+    return db_transaction(lambda conn: conn.execute(query, values))
+
+def hash_file(path):
+    # Same MD5 MobSF uses to identify an upload, streamed over a memory map
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return digest.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                for offset in range(0, len(view), HASH_CHUNK_SIZE):
+                    digest.update(view[offset:offset + HASH_CHUNK_SIZE])
+            finally:
+                view.release()
+    return digest.hexdigest()
+
+def file_md5(file):
+    # hash_file once per file version, so the cache look-ahead and the cache stage share the work
+    stat = os.stat(file)
+    key = (file, stat.st_size, stat.st_mtime_ns)
+    with _file_hashes_lock:
+        if key in _file_hashes:
+            return _file_hashes[key]
+    digest = hash_file(file)
+    with _file_hashes_lock:
+        _file_hashes[key] = digest
+    return digest
+
+SENSITIVE_HEADERS = {"authorization", "cookie", "set-cookie", "x-mobsf-api-key"}
+
+def safe_headers(headers):
+    # Credentials never reach the log file, which log_store.py indexes for search
+    return {name: "<redacted>" if name.lower() in SENSITIVE_HEADERS else value for name, value in headers.items()}
+
+class Lazy:
+    """A log argument computed only if the record is actually emitted."""
+
+    def __init__(self, fn, *args):
+        self.fn = fn
+        self.args = args
+
+    def __str__(self):
+        return str(self.fn(*self.args))
+
+def response_preview(response):
+    # First LOG_PREVIEW_BYTES of a body without pulling a streamed response into memory
+    try:
+        return next(response.iter_content(chunk_size=LOG_PREVIEW_BYTES), b"")[:LOG_PREVIEW_BYTES]
+    except (requests.exceptions.RequestException, RuntimeError):
+        return b""
+
+def stream_to_store(response, extension):
+    # Stream the body into the content-addressed store; identical icons and reports share one file
+    try:
+        return store_chunks(response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE), extension)
+    finally:
+        response.close()
+
+def format_rate(num_bytes, seconds):
+    return f"{num_bytes / 1024 / 1024:.1f} MB in {seconds:.1f}s ({num_bytes / 1024 / 1024 / max(seconds, 0.001):.1f} MB/s)"
+
+def save_icon(session, scan_hash, app_name, host=None, api_key=None):
+    log("DEBUG", "Saving icon for app: %s, scan hash: %s", app_name, scan_hash)
+    host = host or MOBSF_HOST
+    api_key = api_key or MOBSF_API_KEY
+
     # Use the complete URL path
-    icon_url = f"{MOBSF_HOST}/download/{scan_hash}-icon.png"
-    icon_filename = f"{app_name.replace(' ', '_')}_{scan_hash}_icon.png"
-    icon_path = os.path.join(batch_dir, "icons", icon_filename)
+    icon_url = f"{host}/download/{scan_hash}-icon.png"
 
     try:
         # Log the full request details for debugging
-        log("DEBUG", f"Requesting icon from URL: {icon_url}")
-        log("DEBUG", f"Session cookies: {dict(session.cookies)}")
-        log("DEBUG", f"Session headers: {dict(session.headers)}")
+        log("DEBUG", "Requesting icon from URL: %s", icon_url)
 
         # Make sure authorization header is present
         if "Authorization" not in session.headers:
-            session.headers.update({"Authorization": MOBSF_API_KEY})
+            session.headers.update({"Authorization": api_key})
 
         # Make the request with session
-        response = session.get(
+        with session.get(
             icon_url,
             allow_redirects=True,
-            timeout=30
-        )
+            timeout=30,
+            stream=True
+        ) as response:
 
-        # Log response details
-        log("DEBUG", f"Response status code: {response.status_code}")
-        log("DEBUG", f"Response headers: {dict(response.headers)}")
-        
-        if response.status_code == 404:
-            log("WARNING", f"Icon not found for {app_name}")
-            return ""
-            
-        response.raise_for_status()
-        
-        # Check if we actually got an image
-        content_type = response.headers.get('content-type', '')
-        if not content_type.startswith('image/'):
-            log("WARNING", f"Unexpected content type received: {content_type}")
-            return ""
-
-        # Save the icon
-        with open(icon_path, "wb") as f:
-            f.write(response.content)
-        
-        log("INFO", f"Icon successfully saved to: {icon_path}")
+            # Log response details
+            log("DEBUG", "Response status code: %s", response.status_code)
+            log("DEBUG", "Response headers: %s", Lazy(safe_headers, response.headers))
+
+            if response.status_code == 404:
+                log("WARNING", "Icon not found for %s", app_name)
+                return ""
+
+            response.raise_for_status()
+
+            # Check if we actually got an image
+            content_type = response.headers.get('content-type', '')
+            if not content_type.startswith('image/'):
+                log("WARNING", "Unexpected content type received: %s", content_type)
+                return ""
+
+            # Save the icon
+            icon_path, written = stream_to_store(response, ".png")
+            metrics.inc("mobsf_bytes_total", written, direction="download", artifact="icon")
+
+        log("INFO", "Icon successfully saved to: %s", icon_path)
         return icon_path
 
     except requests.exceptions.RequestException as e:
-        log("ERROR", f"Failed to download icon for {app_name}: {str(e)}")
-        if hasattr(e.response, 'content'):
-            log("DEBUG", f"Error response content: {e.response.content}")
+        log("ERROR", "Failed to download icon for %s: %s", app_name, e)
+        if getattr(e, 'response', None) is not None:
+            log("DEBUG", "Error response content: %s", Lazy(response_preview, e.response))
         return ""
     except IOError as e:
-        log("ERROR", f"Failed to save icon for {app_name}: {str(e)}")
+        log("ERROR", "Failed to save icon for %s: %s", app_name, e)
         return ""
 
-def process_app(file, batch_id, batch_dir, session):
-    log("INFO", f"Starting scan for {file}")
-
+def local_metadata(file):
+    # Bundle id, version and name from the binary itself, read once per file version and shared across threads
+    stat = os.stat(file)
+    key = (file, stat.st_size, stat.st_mtime_ns)
+    with _app_metadata_lock:
+        if key in _app_metadata:
+            return _app_metadata[key]
     try:
-        log("DEBUG", f"Initial session cookies: {dict(session.cookies)}")
-        log("DEBUG", f"Initial session headers: {dict(session.headers)}")
+        metadata = read_metadata(file, with_icon=False)
+        log("DEBUG", "Local metadata for %s: %s %s (%s)", file, metadata["bundle_id"], metadata["version"], metadata["app_name"])
+    except ValueError as e:
+        log("WARNING", "%s", e)
+        metadata = None
+    with _app_metadata_lock:
+        _app_metadata[key] = metadata
+    return metadata
+
+def scanned_versions(files):
+    # Files whose bundle id and version already have a stored scan
+    known = set()
+    for file in files:
+        metadata = local_metadata(file)
+        if metadata and metadata["bundle_id"] and metadata["version"] and db_query(
+                "SELECT 1 FROM scans WHERE package_name = ? AND version = ? LIMIT 1",
+                (metadata["bundle_id"], metadata["version"])):
+            known.add(file)
+    return known
+
+def new_app(file, batch_id, batch_dir, instance=None, progress=None):
+    app = {
+        "file": file,
+        "instance": instance,
+        "host": instance["host"] if instance else MOBSF_HOST,
+        "api_key": instance["api_key"] if instance else MOBSF_API_KEY,
+        "batch_id": batch_id,
+        "batch_dir": batch_dir,
+        "file_hash": None,
+        "cached": False,
+        "scan_hash": None,
+        "scorecard": None,
+        "icon_path": "",
+        "pdf_path": "",
+        "error": None,
+        "completed": set(),
+        "timings": {},
+    }
+    stat = os.stat(file)
+    app["file_size"], app["file_mtime"] = stat.st_size, stat.st_mtime_ns
+    app["metadata"] = local_metadata(file)
+    if progress:
+        restore_progress(app, progress)
+    # Stages skipped on resume leave the timings incomplete, so the scheduler does not learn from them
+    app["resumed"] = bool(app["completed"])
+    return app
+
+def cache_entry(file_hash):
+    """(scorecard, icon_path, pdf_path) cached for this MD5, or None and why it cannot be reused."""
+    rows = db_query(
+        "SELECT mobsf_version, scorecard, icon_path, pdf_path FROM scan_cache WHERE file_hash = ?",
+        (file_hash,)
+    )
+    if not rows:
+        return None, None
 
-        # Upload file to MobSF
-        log("DEBUG", f"Uploading file: {file}")
-        log("DEBUG", f"Upload URL: {MOBSF_HOST}/api/v1/upload")
+    mobsf_version, scorecard, icon_path, pdf_path = rows[0]
+    if CACHE_VERSION and mobsf_version != CACHE_VERSION:
+        return None, f"is from MobSF {mobsf_version}"
+    if not pdf_path or not os.path.exists(pdf_path):
+        return None, "has no report on disk"
+    return (scorecard, icon_path, pdf_path), None
 
-        # Construct the multipart form-data request using requests-toolbelt
+def cache_hit(file):
+    return USE_CACHE and cache_entry(file_md5(file))[0] is not None
+
+def check_cache(app, session=None):
+    file = app["file"]
+    app["file_hash"] = file_md5(file)
+    log("DEBUG", "Local MD5 for %s: %s", file, app["file_hash"])
+    if not USE_CACHE:
+        return True
+
+    entry, reason = cache_entry(app["file_hash"])
+    if reason:
+        log("INFO", "Cached result for %s %s, rescanning", file, reason)
+    if entry is None:
+        return True
+
+    scorecard, icon_path, pdf_path = entry
+
+    app["cached"] = True
+    app["scan_hash"] = app["file_hash"]
+    app["scorecard"] = json.loads(scorecard)
+    # Stored artifacts are immutable, so the new scan row can point at the same files
+    app["pdf_path"] = pdf_path
+    if icon_path and os.path.exists(icon_path):
+        app["icon_path"] = icon_path
+    log("INFO", "Reusing cached MobSF results for %s (%s)", file, app["file_hash"])
+    return True
+
+def cache_scan(app):
+    return db_execute(
+        """
+        INSERT OR REPLACE INTO scan_cache (file_hash, mobsf_version, scorecard, icon_path, pdf_path)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        (app["file_hash"], app["scorecard"].get("version"), json.dumps(app["scorecard"]),
+         app["icon_path"], app["pdf_path"])
+    )
+
+def upload_app(app, session):
+    if app["cached"]:
+        return True
+    from requests_toolbelt.multipart.encoder import MultipartEncoder, MultipartEncoderMonitor
+
+    file = app["file"]
+
+    # Upload file to MobSF
+    log("DEBUG", "Uploading file: %s", file)
+    log("DEBUG", "Upload URL: %s/api/v1/upload", app["host"])
+
+    session.headers.update({"Authorization": app["api_key"]})
+
+    with open(file, "rb") as f:
+        # Construct the multipart form-data request using requests-toolbelt; the body is streamed from disk
         m = MultipartEncoder(
             fields={
-                "file": (os.path.basename(file), open(file, "rb"), "application/octet-stream")
+                "file": (os.path.basename(file), f, "application/octet-stream")
             }
         )
+        started = time.monotonic()
+        progress = {"next": UPLOAD_PROGRESS_STEP}
 
-        session.headers.update({"Authorization": MOBSF_API_KEY})
+        def report_progress(monitor):
+            percent = monitor.bytes_read * 100 // max(monitor.len, 1)
+            if percent >= progress["next"] and percent < 100:
+                progress["next"] = percent - percent % UPLOAD_PROGRESS_STEP + UPLOAD_PROGRESS_STEP
+                log("DEBUG", "Uploading %s: %d%%, %s", os.path.basename(file), percent,
+                    format_rate(monitor.bytes_read, time.monotonic() - started))
 
+        monitor = MultipartEncoderMonitor(m, report_progress)
         upload_resp = session.post(
-            f"{MOBSF_HOST}/api/v1/upload",
-            data=m,
+            f"{app['host']}/api/v1/upload",
+            data=monitor,
             headers={
-                "Content-Type": m.content_type,
+                "Content-Type": monitor.content_type,
             },
             timeout=60  # Increase timeout to account for larger file uploads
         )
-        log("DEBUG", f"Upload response status code: {upload_resp.status_code}")
-        log("DEBUG", f"Upload response headers: {dict(upload_resp.headers)}")
-        log("DEBUG", f"Upload response cookies: {dict(upload_resp.cookies)}")
-        log("DEBUG", f"Session cookies after upload: {dict(session.cookies)}")
-        log("DEBUG", f"Upload response content: {upload_resp.content}")
-        upload_resp.raise_for_status()
-        scan_hash = upload_resp.json()["hash"]
-
-        # Start scan
-        log("DEBUG", f"Starting scan for hash: {scan_hash}")
-        log("DEBUG", f"Scan URL: {MOBSF_HOST}/api/v1/scan")
-        scan_resp = session.post(f"{MOBSF_HOST}/api/v1/scan", data={"hash": scan_hash})
-        log("DEBUG", f"Scan response status code: {scan_resp.status_code}")
-        log("DEBUG", f"Scan response headers: {dict(scan_resp.headers)}")
-        log("DEBUG", f"Scan response cookies: {dict(scan_resp.cookies)}")
-        log("DEBUG", f"Session cookies after scan: {dict(session.cookies)}")
-        scan_resp.raise_for_status()
-
-        # Get AppSec Scorecard
-        log("DEBUG", f"Getting AppSec Scorecard for hash: {scan_hash}")
-        log("DEBUG", f"Scorecard URL: {MOBSF_HOST}/api/v1/scorecard")
-        scorecard_resp = session.post(f"{MOBSF_HOST}/api/v1/scorecard", data={"hash": scan_hash})
-        log("DEBUG", f"Scorecard response status code: {scorecard_resp.status_code}")
-        log("DEBUG", f"Scorecard response headers: {dict(scorecard_resp.headers)}")
-        log("DEBUG", f"Scorecard response cookies: {dict(scorecard_resp.cookies)}")
-        log("DEBUG", f"Session cookies after scorecard: {dict(session.cookies)}")
-        scorecard_resp.raise_for_status()
-        scorecard_data = scorecard_resp.json()
-
-        # Extract needed information
-        app_name = scorecard_data.get('app_name', 'Unknown')
-        bundle_id = scorecard_data.get('file_name', 'Unknown')  # Assuming package_name is available in scorecard_data
-
-        if file.endswith(".apk"):
-            platform = "Android"
-        elif file.endswith(".ipa"):
-            platform = "iOS"
-        else:
-            platform = "Unknown"
-
-        version = scorecard_data.get('version_name', 'Unknown')
-        security_score = scorecard_data.get('security_score', 0)
-
-        # Count findings by category
-        high_findings = len(scorecard_data.get('high', []))
-        warning_findings = len(scorecard_data.get('warning', []))
-        info_findings = len(scorecard_data.get('info', []))
-        secure_findings = len(scorecard_data.get('secure', []))
-
-        # Save the icon
-        icon_path = save_icon(session, scan_hash, app_name, batch_dir)
-
-        # Generate PDF report
-        pdf_filename = f"{app_name.replace(' ', '_')}_{scan_hash}.pdf"
-        pdf_path = os.path.join(batch_dir, "reports", pdf_filename)
-        log("DEBUG", f"Downloading PDF report for hash: {scan_hash}")
-        log("DEBUG", f"PDF report URL: {MOBSF_HOST}/api/v1/download_pdf")
-        pdf_resp = session.post(f"{MOBSF_HOST}/api/v1/download_pdf", data={"hash": scan_hash})
-        log("DEBUG", f"PDF report response status code: {pdf_resp.status_code}")
-        log("DEBUG", f"PDF report response headers: {dict(pdf_resp.headers)}")
-        log("DEBUG", f"PDF report response cookies: {dict(pdf_resp.cookies)}")
-        log("DEBUG", f"Session cookies after PDF download: {dict(session.cookies)}")
-        pdf_resp.raise_for_status()
-        with open(pdf_path, "wb") as f:
-            f.write(pdf_resp.content)
-
-        # Store in SQLite database
-        insert_query = """
-        INSERT INTO scans (
-            batch_id, app_name, bundle_id, version, platform,
-            security_score, high_findings, warning_findings,
-            info_findings, secure_findings, icon_path, pdf_path
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    log("INFO", "Uploaded %s: %s", os.path.basename(file), format_rate(monitor.len, time.monotonic() - started))
+    metrics.inc("mobsf_bytes_total", monitor.len, direction="upload", artifact="app")
+    log("DEBUG", "Upload response status code: %s", upload_resp.status_code)
+    log("DEBUG", "Upload response headers: %s", Lazy(safe_headers, upload_resp.headers))
+    log("DEBUG", "Upload response content: %s", Lazy(response_preview, upload_resp))
+    upload_resp.raise_for_status()
+    app["scan_hash"] = upload_resp.json()["hash"]
+    return True
+
+def scan_app(app, session):
+    if app["cached"]:
+        return True
+    scan_hash = app["scan_hash"]
+    log("DEBUG", "Starting scan for hash: %s", scan_hash)
+    log("DEBUG", "Scan URL: %s/api/v1/scan", app["host"])
+    session.headers.update({"Authorization": app["api_key"]})
+    started = time.monotonic()
+    try:
+        # MobSF analyses inside this request; rather than hold the connection open, let it run and poll
+        scan_resp = session.post(f"{app['host']}/api/v1/scan", data={"hash": scan_hash},
+                                 timeout=(30, SCAN_START_TIMEOUT))
+    except requests.exceptions.ReadTimeout:
+        log("DEBUG", "Scan for hash %s still running, tracking it via scan_logs", scan_hash)
+        get_scan_poller().wait(app, session, started)
+        return True
+    log("DEBUG", "Scan response status code: %s", scan_resp.status_code)
+    log("DEBUG", "Scan response headers: %s", Lazy(safe_headers, scan_resp.headers))
+    scan_resp.raise_for_status()
+    get_scan_poller().record(os.path.getsize(app["file"]), time.monotonic() - started)
+    return True
+
+def fetch_scorecard(app, session):
+    if app["cached"]:
+        return True
+    scan_hash = app["scan_hash"]
+    log("DEBUG", "Getting AppSec Scorecard for hash: %s", scan_hash)
+    log("DEBUG", "Scorecard URL: %s/api/v1/scorecard", app["host"])
+    session.headers.update({"Authorization": app["api_key"]})
+    scorecard_resp = session.post(f"{app['host']}/api/v1/scorecard", data={"hash": scan_hash}, timeout=API_TIMEOUT)
+    log("DEBUG", "Scorecard response status code: %s", scorecard_resp.status_code)
+    log("DEBUG", "Scorecard response headers: %s", Lazy(safe_headers, scorecard_resp.headers))
+    scorecard_resp.raise_for_status()
+    app["scorecard"] = scorecard_resp.json()
+    return True
+
+def local_icon(app):
+    if not app["metadata"]:
+        return ""
+    try:
+        metadata = read_metadata(app["file"])
+    except ValueError as e:
+        log("WARNING", "%s", e)
+        return ""
+    if not metadata["icon"]:
+        return ""
+    icon_path, _ = store_chunks([metadata["icon"]], metadata["icon_extension"])
+    log("DEBUG", "Icon for %s extracted from the binary to %s", app["file"], icon_path)
+    return icon_path
+
+def fetch_icon(app, session):
+    if app["cached"]:
+        return True
+    # The binary usually carries the icon, which saves a request that often 404s for IPAs
+    app["icon_path"] = local_icon(app)
+    if app["icon_path"]:
+        return True
+    app_name = app["scorecard"].get('app_name', 'Unknown')
+    session.headers.update({"Authorization": app["api_key"]})
+    app["icon_path"] = save_icon(session, app["scan_hash"], app_name, host=app["host"], api_key=app["api_key"])
+    return True
+
+def download_pdf(app, session):
+    if app["cached"]:
+        return True
+    scan_hash = app["scan_hash"]
+    app_name = app["scorecard"].get('app_name', 'Unknown')
+    session.headers.update({"Authorization": app["api_key"]})
+
+    # Generate PDF report
+    log("DEBUG", "Downloading PDF report for %s, hash: %s", app_name, scan_hash)
+    log("DEBUG", "PDF report URL: %s/api/v1/download_pdf", app["host"])
+    started = time.monotonic()
+    pdf_resp = session.post(f"{app['host']}/api/v1/download_pdf", data={"hash": scan_hash}, stream=True,
+                            timeout=API_TIMEOUT)
+    log("DEBUG", "PDF report response status code: %s", pdf_resp.status_code)
+    log("DEBUG", "PDF report response headers: %s", Lazy(safe_headers, pdf_resp.headers))
+    pdf_resp.raise_for_status()
+    pdf_path, written = stream_to_store(pdf_resp, ".pdf")
+    log("DEBUG", "PDF report saved to %s: %s", pdf_path, format_rate(written, time.monotonic() - started))
+    metrics.inc("mobsf_bytes_total", written, direction="download", artifact="pdf")
+    app["pdf_path"] = pdf_path
+    return True
+
+def store_scan(app, session=None):
+    file = app["file"]
+    scorecard_data = app["scorecard"]
+
+    # Extract needed information
+    app_name = scorecard_data.get('app_name', 'Unknown')
+    bundle_id = scorecard_data.get('file_name', 'Unknown')  # Assuming package_name is available in scorecard_data
+
+    if file.endswith(".apk"):
+        platform = "Android"
+    elif file.endswith(".ipa"):
+        platform = "iOS"
+    else:
+        platform = "Unknown"
+
+    version = scorecard_data.get('version_name', 'Unknown')
+    security_score = scorecard_data.get('security_score', 0)
+
+    # Count findings by category
+    high_findings = len(scorecard_data.get('high', []))
+    warning_findings = len(scorecard_data.get('warning', []))
+    info_findings = len(scorecard_data.get('info', []))
+    secure_findings = len(scorecard_data.get('secure', []))
+
+    # Store in SQLite database
+    insert_query = """
+    INSERT INTO scans (
+        batch_id, app_name, bundle_id, version, platform,
+        security_score, high_findings, warning_findings,
+        info_findings, secure_findings, icon_path, pdf_path, package_name
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    values = (
+        app["batch_id"], app_name, bundle_id, version, platform,
+        security_score, high_findings, warning_findings,
+        info_findings, secure_findings, app["icon_path"], app["pdf_path"],
+        app["metadata"]["bundle_id"] if app["metadata"] else None
+    )
+
+    def insert_scan(conn):
+        # The dashboard rollups, the per-finding rows and the store checkpoint change in the same
+        # transaction as the scan row, so --resume never finds a stored scan without its checkpoint
+        scan_id = conn.execute(insert_query, values).lastrowid
+        update_rollups(conn, scan_id)
+        store_findings(conn, scan_id, scorecard_data)
+        write_checkpoint(conn, app, "store")
+
+    if not db_transaction(insert_scan):
+        return False
+
+    if not app["cached"] and app["file_hash"]:
+        cache_scan(app)
+    return True
+
+def record_timing(app, succeeded):
+    return db_execute(
         """
-        values = (
-            batch_id, app_name, bundle_id, version, platform,
-            security_score, high_findings, warning_findings,
-            info_findings, secure_findings, icon_path, pdf_path
-        )
-        if not db_execute(insert_query, values):
-            return False
+        INSERT INTO scan_timings (
+            batch_id, file, file_size, file_mtime, succeeded, cached, resumed, total_seconds, stages
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (app["batch_id"], app["file"], app["file_size"], app["file_mtime"], int(succeeded), int(app["cached"]),
+         int(app["resumed"]), sum(app["timings"].values()), json.dumps(app["timings"]))
+    )
+
+# App fields saved with each checkpoint so a resumed run can pick up after the last finished stage
+CHECKPOINT_FIELDS = ("file_hash", "cached", "scan_hash", "host", "scorecard", "icon_path", "pdf_path")
+
+def write_checkpoint(conn, app, stage):
+    state = {field: app[field] for field in CHECKPOINT_FIELDS}
+    conn.execute(
+        """
+        INSERT INTO scan_progress (batch_id, file, stage, scan_hash, state)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (batch_id, file) DO UPDATE SET
+            stage = excluded.stage,
+            scan_hash = excluded.scan_hash,
+            state = excluded.state,
+            updated_at = CURRENT_TIMESTAMP
+        """,
+        (app["batch_id"], app["file"], stage, app["scan_hash"], json.dumps(state))
+    )
+
+def save_checkpoint(app, stage):
+    return db_transaction(lambda conn: write_checkpoint(conn, app, stage))
+
+def load_progress(batch_id):
+    rows = db_query("SELECT file, stage, state FROM scan_progress WHERE batch_id = ?", (batch_id,))
+    return {file: {"stage": stage, "state": json.loads(state)} for file, stage, state in rows}
+
+def restore_progress(app, progress):
+    entry = progress.get(app["file"])
+    if not entry:
+        return
+    state = entry["state"]
+    # A MobSF hash is only meaningful on the instance that received the upload
+    if state["scan_hash"] and state["host"] != app["host"]:
+        log("INFO", "%s was uploaded to %s, starting over on %s", app["file"], state["host"], app["host"], app=app)
+        return
+
+    for field in CHECKPOINT_FIELDS:
+        if field != "host":
+            app[field] = state[field]
+    stage_names = [name for name, _ in STAGES]
+    app["completed"] = set(stage_names[:stage_names.index(entry["stage"]) + 1])
+    log("INFO", "Resuming %s after stage %s", app["file"], entry["stage"], app=app)
 
-        log("INFO", f"Scan completed successfully for {file}")
+# Stages every app goes through, in order
+STAGES = [
+    ("cache", check_cache),
+    ("upload", upload_app),
+    ("scan", scan_app),
+    ("scorecard", fetch_scorecard),
+    ("icon", fetch_icon),
+    ("pdf", download_pdf),
+    ("store", store_scan),
+]
+
+def report_failure(app, error):
+    # 5xx responses are already counted by the session hook; this covers the ones that never got a response
+    instance = app.get("instance")
+    if instance and getattr(error, "response", None) is None and is_instance_failure(error):
+        instance["health"].failure(type(error).__name__)
+
+def call_with_retries(name, stage, app, session):
+    attempt = 0
+    relogged_in = False
+    while True:
+        try:
+            return stage(app, session)
+        except SessionExpired:
+            if relogged_in or not app.get("instance"):
+                raise
+            relogged_in = True
+            relogin(app["instance"], session)
+        except requests.exceptions.RequestException as e:
+            report_failure(app, e)
+            if name not in RETRY_STAGES or not is_instance_failure(e) or attempt >= STAGE_RETRIES:
+                raise
+            instance = app.get("instance")
+            paused = instance["health"].paused_for() if instance else 0.0
+            if paused and app.get("pool") and app["pool"].can_requeue(app["tried"]):
+                # Sooner to move to another instance than to sit out this one's cool-down
+                raise
+            attempt += 1
+            metrics.inc("mobsf_stage_retries_total", stage=name)
+            # Full jitter, so apps that failed together do not all come back together
+            delay = paused + random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+            log("WARNING", "Stage %s failed for %s (%s), retry %d/%d in %.1fs",
+                name, app["file"], e, attempt, STAGE_RETRIES, delay)
+            time.sleep(delay)
+
+def run_stage(name, stage, app, session):
+    file = app["file"]
+    if name in app["completed"]:
+        return True
+    # Tag every log record written by this stage with the app it belongs to
+    _worker_state.app = app
+    _worker_state.stage = name
+    started = time.monotonic()
+    succeeded = False
+    try:
+        if not call_with_retries(name, stage, app, session):
+            return False
+        app["timings"][name] = time.monotonic() - started
+        log("DEBUG", "Finished stage %s in %.3fs", name, app["timings"][name])
+        app["completed"].add(name)
+        if name != "store":  # store_scan checkpoints inside its own transaction
+            save_checkpoint(app, name)
+        succeeded = True
         return True
     except requests.exceptions.RequestException as e:
-        log("ERROR", f"Failed to process {file}: {e}")
-        if hasattr(e, 'response'):
-            log("DEBUG", f"Error response content: {e.response.content}")
-            log("DEBUG", f"Error response headers: {dict(e.response.headers)}")
-            log("DEBUG", f"Error response cookies: {dict(e.response.cookies)}")
+        app["error"] = e
+        log("ERROR", "Failed to process %s: %s", file, e)
+        if getattr(e, 'response', None) is not None:
+            log("DEBUG", "Error response content: %s", Lazy(response_preview, e.response))
+            log("DEBUG", "Error response headers: %s", Lazy(safe_headers, e.response.headers))
         return False
     except sqlite3.Error as e:
-        log("ERROR", f"Database error while processing {file}: {e}")
+        app["error"] = e
+        log("ERROR", "Database error while processing %s: %s", file, e)
         return False
     except Exception as e:
-        log("ERROR", f"Unexpected error while processing {file}: {e}")
+        app["error"] = e
+        log("ERROR", "Unexpected error while processing %s: %s", file, e)
         return False
+    finally:
+        # A cache hit passes straight through the MobSF stages; timing those would only drag the percentiles down
+        if not app["cached"] or name in ("cache", "store"):
+            metrics.observe("mobsf_stage_seconds", time.monotonic() - started, stage=name)
+        metrics.inc("mobsf_stage_runs_total", stage=name, outcome="succeeded" if succeeded else "failed")
+        _worker_state.app = None
+        _worker_state.stage = None
+
+def run_app(app, session):
+    for name, stage in STAGES:
+        if not run_stage(name, stage, app, session):
+            return False
+
+    log("INFO", "Scan completed successfully for %s", app["file"], app=app)
+    return True
+
+def process_app(file, batch_id, batch_dir, session, instance=None):
+    log("INFO", "Starting scan for %s", file)
+    return run_app(new_app(file, batch_id, batch_dir, instance), session)
+
+def is_instance_failure(error):
+    # Connection problems, timeouts and 5xx point at the MobSF host rather than at the app itself
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    response = getattr(error, "response", None)
+    return response is not None and response.status_code >= 500
+
+class InstanceHealth:
+    """AIMD concurrency limit and circuit breaker for one MobSF instance.
+
+    The limit starts at the configured concurrency, so a healthy MobSF runs at full speed from
+    the first app. A 5xx, a timeout or a cheap call running far above its usual latency halves it;
+    each app that finishes then raises it by 1/limit, so about one per round of apps.
+    INSTANCE_MAX_FAILURES failures in a row, each at least CONCURRENCY_DECREASE_INTERVAL after the
+    previous one, open the breaker, which keeps new apps off the
+    instance for a cool-down and then lets them back in one at a time.
+    """
+
+    def __init__(self, host, max_limit):
+        self.host = host
+        self.lock = threading.Lock()
+        self.max_limit = max_limit
+        self.limit = float(max_limit)
+        self.latency = {}  # endpoint -> moving average of response time
+        self.baseline = {}  # endpoint -> usual response time, tracking the lowest average seen
+        self.failures = 0
+        self.last_failure = float("-inf")
+        self.last_decrease = 0.0
+        self.cooldown = BREAKER_COOLDOWN
+        self.open_until = 0.0
+
+    def has_room(self, in_flight):
+        with self.lock:
+            return time.monotonic() >= self.open_until and in_flight < int(self.limit)
+
+    def paused_for(self):
+        with self.lock:
+            return max(self.open_until - time.monotonic(), 0.0)
+
+    def observe(self, response, *args, **kwargs):
+        # requests response hook, installed on every session that talks to this instance
+        endpoint = urllib.parse.urlparse(response.url).path
+        if endpoint.startswith("/download/"):
+            endpoint = "/download"  # one icon URL per app
+        metrics.observe("mobsf_request_seconds", response.elapsed.total_seconds(), host=self.host, endpoint=endpoint)
+        metrics.inc("mobsf_responses_total", host=self.host, code=str(response.status_code))
+        if response.status_code >= 500:
+            self.failure(f"HTTP {response.status_code}")
+        else:
+            self.responded(endpoint, response.elapsed.total_seconds())
+
+    def responded(self, endpoint, latency):
+        with self.lock:
+            self.failures = 0
+            self.cooldown = BREAKER_COOLDOWN
+            if endpoint not in LATENCY_ENDPOINTS:
+                return
+            average = self.latency.get(endpoint, latency)
+            average = self.latency[endpoint] = 0.8 * average + 0.2 * latency
+            baseline = self.baseline.get(endpoint, average)
+            # Creeps up slowly so a MobSF that is just slower everywhere is not throttled forever
+            baseline = self.baseline[endpoint] = min(average, baseline + 0.01 * (average - baseline))
+            if average > max(baseline * LATENCY_SLOWDOWN, LATENCY_FLOOR):
+                self._decrease(f"{endpoint} averaging {average:.1f}s")
+
+    def app_finished(self):
+        with self.lock:
+            before = int(self.limit)
+            self.limit = min(self.limit + 1 / self.limit, self.max_limit)
+            if int(self.limit) > before:
+                log("INFO", "Raising concurrency on %s to %d", self.host, int(self.limit))
+
+    def failure(self, reason):
+        metrics.inc("mobsf_instance_failures_total", host=self.host)
+        with self.lock:
+            now = time.monotonic()
+            # Apps that were in flight together fail together; like the halving, such a burst counts once
+            if now - self.last_failure >= CONCURRENCY_DECREASE_INTERVAL:
+                self.failures += 1
+            self.last_failure = now
+            self._decrease(reason)
+            # A failure right after a cool-down reopens the breaker, for twice as long
+            if self.failures >= INSTANCE_MAX_FAILURES and now >= self.open_until:
+                self.open_until = now + self.cooldown
+                self.limit = 1.0
+                log("WARNING", "Pausing new uploads to %s for %.0fs after %d failures in a row (%s)",
+                    self.host, self.cooldown, self.failures, reason)
+                self.cooldown = min(self.cooldown * 2, BREAKER_MAX_COOLDOWN)
+
+    def _decrease(self, reason):
+        now = time.monotonic()
+        if now - self.last_decrease < CONCURRENCY_DECREASE_INTERVAL or self.limit <= 1:
+            return
+        self.last_decrease = now
+        self.limit = max(self.limit / 2, 1.0)
+        log("WARNING", "Lowering concurrency on %s to %d (%s)", self.host, int(self.limit), reason)
+
+class InstancePool:
+    """Logged-in MobSF instances that a batch is spread across."""
+
+    def __init__(self, instances):
+        self.instances = instances
+        self.lock = threading.Condition()
+
+    def acquire(self, exclude=(), wait=True):
+        # Least-loaded instance with room under its concurrency limit, skipping hosts this file already failed on.
+        # With wait=False the limits are ignored, for callers that must not block.
+        deadline = time.monotonic() + INSTANCE_WAIT_MAX
+        with self.lock:
+            while True:
+                candidates = [i for i in self.instances if i["host"] not in exclude]
+                if not candidates:
+                    return None
+                ready = [i for i in candidates if not wait or i["health"].has_room(i["in_flight"])]
+                if ready:
+                    instance = min(ready, key=lambda i: i["in_flight"] / i["health"].limit)
+                    instance["in_flight"] += 1
+                    return instance
+                if time.monotonic() >= deadline:
+                    return None
+                # Limits also change from responses and breakers reopen on a timer, so look again regularly
+                self.lock.wait(timeout=1.0)
+
+    def release(self, instance, app, succeeded, tried):
+        """Returns True if the app should be requeued on another instance."""
+        with self.lock:
+            instance["in_flight"] -= 1
+            # A cache hit never reached MobSF, so it says nothing about how much more load it can take
+            if succeeded and not app["cached"]:
+                instance["health"].app_finished()
+            self.lock.notify_all()
+            if succeeded or not is_instance_failure(app["error"]):
+                return False
+            return self.can_requeue(tried)
+
+    def can_requeue(self, tried):
+        return any(i["host"] not in tried for i in self.instances)
+
+    def collect_metrics(self):
+        # Registry collector: mirrors slots and limits into gauges each time /metrics is scraped
+        with self.lock:
+            for instance in self.instances:
+                health = instance["health"]
+                metrics.set("mobsf_apps_in_flight", instance["in_flight"], host=instance["host"])
+                metrics.set("mobsf_concurrency_limit", int(health.limit), host=instance["host"])
+                metrics.set("mobsf_breaker_paused_seconds", round(health.paused_for(), 1), host=instance["host"])
+
+def acquire_instance(pool, file, tried, wait=True):
+    # A cache hit never talks to MobSF, so it neither queues for a slot nor sits out an open breaker
+    return pool.acquire(exclude=tried, wait=wait and not cache_hit(file))
+
+def login_instances(specs, max_concurrency, fresh_login=False):
+    instances = []
+    for host, api_key, username, password in specs:
+        try:
+            session = open_session(host, username, password, fresh_login)
+            log("INFO", "Successfully logged in to MobSF at %s", host)
+        except Exception as e:
+            log("ERROR", "Failed to log in to MobSF at %s: %s", host, e)
+            continue
+        health = InstanceHealth(host, max_concurrency)
+        session.hooks["response"].extend([health.observe, check_login])
+        # Shared by every worker session for this instance: one connection per app in flight, plus the poller
+        adapter = HTTPAdapter(pool_maxsize=max_concurrency + 1)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        instances.append({
+            "host": host,
+            "api_key": api_key,
+            "credentials": (username, password),
+            "session": session,
+            "login_lock": threading.Lock(),
+            "health": health,
+            "in_flight": 0,
+        })
+    return instances
+
+def count_app(app, succeeded):
+    metrics.inc("mobsf_apps_total", outcome="failed" if not succeeded else "cached" if app["cached"] else "scanned")
+
+def scan_worker(file, batch_id, batch_dir, pool, progress=None):
+    log("INFO", "Starting scan for %s", file)
+    tried = set()
+    while True:
+        instance = acquire_instance(pool, file, tried)
+        if instance is None:
+            log("ERROR", "No MobSF instance available for %s", file)
+            count_app(None, False)
+            return False
+        tried.add(instance["host"])
+
+        app = new_app(file, batch_id, batch_dir, instance, progress)
+        app["pool"], app["tried"] = pool, tried
+        succeeded = run_app(app, get_worker_session(instance["session"]))
+        record_timing(app, succeeded)
+        if not pool.release(instance, app, succeeded, tried):
+            count_app(app, succeeded)
+            return succeeded
+        log("WARNING", "Requeueing %s after MobSF failure on %s", file, instance["host"], app=app)
+
+def scan_files(files, batch_id, batch_dir, pool, workers=1, progress=None):
+    scan_count = 0
+    error_count = 0
+
+    if workers <= 1:
+        for file in files:
+            if scan_worker(file, batch_id, batch_dir, pool, progress):
+                scan_count += 1
+            else:
+                error_count += 1
+        return scan_count, error_count
+
+    log("INFO", "Scanning %d apps with %d workers", len(files), workers)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan-worker") as executor:
+        futures = {
+            executor.submit(scan_worker, file, batch_id, batch_dir, pool, progress): file
+            for file in files
+        }
+        for future in as_completed(futures):
+            try:
+                succeeded = future.result()
+            except Exception as e:
+                log("ERROR", "Worker crashed while processing %s: %s", futures[future], e)
+                succeeded = False
+            if succeeded:
+                scan_count += 1
+            else:
+                error_count += 1
+
+    return scan_count, error_count
+
+def run_pipeline(files, batch_id, batch_dir, pool, stage_workers, progress=None):
+    queues = [queue.Queue() for _ in STAGES]
+    stats = {name: {"apps": 0, "queued": 0.0, "working": 0.0} for name, _ in STAGES}
+    counts = {"success": 0, "failed": 0}
+    state_lock = threading.Condition()
+    outstanding = [0]
+
+    def finish(app, succeeded):
+        count_app(app, succeeded)
+        with state_lock:
+            counts["success" if succeeded else "failed"] += 1
+            outstanding[0] -= 1
+            state_lock.notify_all()
+
+    def enqueue(file, tried, wait=True):
+        instance = acquire_instance(pool, file, tried, wait)
+        if instance is None:
+            log("ERROR", "No MobSF instance available for %s", file)
+            return False
+        tried.add(instance["host"])
+        app = new_app(file, batch_id, batch_dir, instance, progress)
+        app["pool"], app["tried"] = pool, tried
+        queues[0].put((app, time.monotonic()))
+        return True
+
+    def stage_loop(index):
+        name, stage = STAGES[index]
+        while True:
+            item = queues[index].get()
+            if item is None:
+                return
+            app, enqueued_at = item
+            instance = app["instance"]
+            started = time.monotonic()
+            succeeded = run_stage(name, stage, app, get_worker_session(instance["session"]))
+            finished = time.monotonic()
+
+            with state_lock:
+                stats[name]["apps"] += 1
+                stats[name]["queued"] += started - enqueued_at
+                stats[name]["working"] += finished - started
+
+            if succeeded and index < len(STAGES) - 1:
+                queues[index + 1].put((app, finished))
+                continue
+
+            if succeeded:
+                log("INFO", "Scan completed successfully for %s", app["file"], app=app)
+            record_timing(app, succeeded)
+            requeue = pool.release(instance, app, succeeded, app["tried"])
+            if requeue:
+                log("WARNING", "Requeueing %s after MobSF failure on %s", app["file"], instance["host"], app=app)
+                # Stage threads must not block on the concurrency limit: the apps holding it may be queued behind them
+                if enqueue(app["file"], app["tried"], wait=False):
+                    continue
+            finish(app, succeeded)
+
+    threads = []
+    for index, (name, _) in enumerate(STAGES):
+        stage_threads = [
+            threading.Thread(target=stage_loop, args=(index,), name=f"{name}-{n}", daemon=True)
+            for n in range(stage_workers[name])
+        ]
+        for thread in stage_threads:
+            thread.start()
+        threads.append(stage_threads)
+
+    log("INFO", "Pipeline stage workers: %s", ", ".join(f"{name}={stage_workers[name]}" for name, _ in STAGES))
+    for file in files:
+        log("INFO", "Starting scan for %s", file)
+        with state_lock:
+            outstanding[0] += 1
+        if not enqueue(file, set()):
+            finish(None, False)
+
+    # Requeued apps can re-enter the first stage, so wait for every app to settle before stopping workers
+    with state_lock:
+        while outstanding[0] > 0:
+            state_lock.wait()
+    for index, stage_threads in enumerate(threads):
+        for _ in stage_threads:
+            queues[index].put(None)
+        for thread in stage_threads:
+            thread.join()
+
+    for name, _ in STAGES:
+        s = stats[name]
+        avg_queued = s["queued"] / s["apps"] if s["apps"] else 0.0
+        avg_working = s["working"] / s["apps"] if s["apps"] else 0.0
+        log("INFO", "Stage %s: %d apps, queued %.1fs (avg %.2fs), working %.1fs (avg %.2fs)",
+            name, s["apps"], s["queued"], avg_queued, s["working"], avg_working)
+
+    return counts["success"], counts["failed"]
+
+def load_timing_history():
+    # Latest attempt per file, latest full scan per file, the recent seconds-per-MB across all apps,
+    # and the recent time spent in each stage
+    full_scan = "succeeded = 1 AND cached = 0 AND resumed = 0"
+    latest = {row[0]: row[1:] for row in db_query("""
+        SELECT file, file_size, file_mtime, succeeded, cached, total_seconds FROM scan_timings
+        WHERE id IN (SELECT MAX(id) FROM scan_timings GROUP BY file)
+    """)}
+    full = {row[0]: row[1:] for row in db_query(f"""
+        SELECT file, file_size, total_seconds FROM scan_timings
+        WHERE id IN (SELECT MAX(id) FROM scan_timings WHERE {full_scan} GROUP BY file)
+    """)}
+    seconds, size = db_query(f"""
+        SELECT TOTAL(total_seconds), TOTAL(file_size) FROM (
+            SELECT total_seconds, file_size FROM scan_timings WHERE {full_scan} ORDER BY id DESC LIMIT ?
+        )
+    """, (SCHEDULE_HISTORY,))[0]
+    seconds_per_mb = seconds / (size / 1024 / 1024) if size else SCAN_SECONDS_PER_MB
+    stage_seconds = {}
+    for (stages,) in db_query(f"SELECT stages FROM scan_timings WHERE {full_scan} ORDER BY id DESC LIMIT ?",
+                              (SCHEDULE_HISTORY,)):
+        for name, stage_time in json.loads(stages).items():
+            stage_seconds[name] = stage_seconds.get(name, 0.0) + stage_time
+    return latest, full, seconds_per_mb, stage_seconds
+
+def remaining_share(checkpoint, stage_seconds):
+    # Share of a full scan's time spent in the stages after checkpoint; an even split without history
+    names = [name for name, _ in STAGES]
+    remaining = names[names.index(checkpoint) + 1:]
+    total = sum(stage_seconds.get(name, 0.0) for name in names)
+    if not total:
+        return len(remaining) / len(names)
+    return sum(stage_seconds.get(name, 0.0) for name in remaining) / total
+
+def predict_duration(file, history, checkpoint=None):
+    """Returns (predicted seconds, whether the app should jump the queue, where the estimate came from).
+
+    A file resumed after checkpoint only runs the later stages, so it gets that share of a full scan.
+    """
+    latest, full, seconds_per_mb, stage_seconds = history
+    stat = os.stat(file)
+    size_mb = stat.st_size / 1024 / 1024
+    last = latest.get(file)
+    changed = last is not None and (last[0], last[1]) != (stat.st_size, stat.st_mtime_ns)
+    failed = last is not None and not last[2]
+
+    if checkpoint:
+        if file in full:
+            full_size, full_seconds = full[file]
+            seconds = full_seconds * (stat.st_size / full_size if full_size else 1.0)
+        else:
+            seconds = max(size_mb * seconds_per_mb, SCHEDULE_MIN_SECONDS)
+        return seconds * remaining_share(checkpoint, stage_seconds), False, "resumed"
+    if last and not changed and not failed and USE_CACHE:
+        # Stored last time, so it comes straight out of scan_cache after hashing
+        return (last[4] if last[3] else size_mb * HASH_SECONDS_PER_MB), False, "cached"
+    if file in full:
+        full_size, full_seconds = full[file]
+        scale = stat.st_size / full_size if full_size else 1.0
+        return full_seconds * scale, changed or failed, "changed" if changed else "failed" if failed else "history"
+    return max(size_mb * seconds_per_mb, SCHEDULE_MIN_SECONDS), changed or failed, "size"
+
+def predict_makespan(durations, workers):
+    # Greedy list scheduling: each app goes to whichever worker frees up first
+    loads = [0.0] * max(workers, 1)
+    for duration in durations:
+        heapq.heapreplace(loads, loads[0] + duration)
+    return max(loads)
+
+def schedule_files(files, workers, deprioritised=(), progress=None):
+    """Orders files failed-or-changed first, then longest predicted duration first; returns (files, makespan).
+
+    Files in deprioritised (bundle id and version already scanned) go after all others. progress holds the
+    checkpoints of a resumed batch, which shorten the predictions of the files they belong to.
+    """
+    history = load_timing_history()
+    progress = progress or {}
+    predictions = {file: predict_duration(file, history, progress.get(file, {}).get("stage")) for file in files}
+    ordered = sorted(files, key=lambda file: (file in deprioritised, not predictions[file][1],
+                                              -predictions[file][0], file))
+    for file in ordered:
+        seconds, urgent, source = predictions[file]
+        note = ", version already scanned" if file in deprioritised else ", moved to the front" if urgent else ""
+        log("DEBUG", "Scheduled %s: predicted %.1fs (%s)%s", file, seconds, source, note)
+
+    makespan = predict_makespan([predictions[file][0] for file in ordered], workers)
+    urgent = sum(1 for file in files if predictions[file][1])
+    known = sum(1 for file in files if predictions[file][2] not in ("size", "resumed"))
+    resumed = sum(1 for file in files if predictions[file][2] == "resumed")
+    log("INFO", "Scheduling %d apps longest-first (%d failed or changed first, %d predicted from their own history, "
+                "%d resumed); predicted makespan %.1fs on %d workers", len(files), urgent, known, resumed, makespan, workers)
+    return ordered, makespan
+
+def metric_total(name, **match):
+    return sum(value for labels, value in metrics.samples(name)
+               if all(labels.get(key) == wanted for key, wanted in match.items()))
+
+def percentile(values, fraction):
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+def write_run_summary(batch_id, mode, workers, wall_seconds, predicted=None):
+    """Stores this run's outcome counts and per-stage timings in batch_runs and batch_stage_timings, and logs them."""
+    durations = {labels["stage"]: histogram for labels, histogram in metrics.samples("mobsf_stage_seconds")}
+    stages = []
+    for name, _ in STAGES:
+        histogram = durations.get(name)
+        if histogram:
+            values = sorted(histogram["values"])
+            stages.append((name, histogram["count"],
+                           metric_total("mobsf_stage_runs_total", stage=name, outcome="failed"),
+                           metric_total("mobsf_stage_retries_total", stage=name), histogram["sum"],
+                           percentile(values, 0.5), percentile(values, 0.95), histogram["max"]))
+    run = (batch_id, mode, workers, wall_seconds, predicted,
+           metric_total("mobsf_apps_total", outcome="scanned"), metric_total("mobsf_apps_total", outcome="cached"),
+           metric_total("mobsf_apps_total", outcome="failed"), metric_total("mobsf_stage_retries_total"),
+           metric_total("mobsf_bytes_total", direction="upload"), metric_total("mobsf_bytes_total", direction="download"),
+           f"-{wall_seconds:.0f} seconds")
+
+    def insert_run(conn):
+        run_id = conn.execute("""
+            INSERT INTO batch_runs (
+                batch_id, mode, workers, wall_seconds, predicted_seconds, apps_scanned, apps_cached, apps_failed,
+                retries, bytes_uploaded, bytes_downloaded, started_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now', ?))
+        """, run).lastrowid
+        conn.executemany("""
+            INSERT INTO batch_stage_timings (
+                run_id, batch_id, stage, runs, failures, retries, total_seconds, p50_seconds, p95_seconds, max_seconds
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(run_id, batch_id) + stage for stage in stages])
+
+    for name, runs, failures, retries, total, p50, p95, slowest in stages:
+        log("INFO", "Stage %s timings: %d runs, %d failed, %d retries, total %.1fs, p50 %.2fs, p95 %.2fs, max %.2fs",
+            name, runs, failures, retries, total, p50, p95, slowest)
+    return db_transaction(insert_run)
+
+# inotify(7) event bits and the fixed part of each event record
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+INOTIFY_EVENT = struct.Struct("iIII")
+
+def is_app_file(name):
+    return (name.endswith(".ipa") or name.endswith(".apk")) and not name.startswith(".")
+
+def open_inotify(folders):
+    # Straight from libc so the daemon needs no extra package; None means fall back to sweeping
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    watches = {}
+    for folder in folders:
+        wd = libc.inotify_add_watch(fd, os.fsencode(folder), IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+        if wd < 0:
+            os.close(fd)
+            return None
+        watches[wd] = folder
+    return fd, watches
+
+class FolderWatcher:
+    """Finds apps in the watched folders and hands each one out once it has stopped changing.
+
+    inotify says which files to look at; a file is settled when its size matched the previous
+    look and it has not been modified for WATCH_DEBOUNCE seconds, so half-written uploads wait.
+    """
+
+    def __init__(self, folders, debounce=WATCH_DEBOUNCE):
+        self.folders = [folder for folder in folders if os.path.isdir(folder)]
+        self.debounce = debounce
+        self.pending = {}  # path -> size at the last look (None before the first)
+        self.seen = {}  # path -> (size, mtime_ns) when it was last handed out
+        self.last_sweep = None
+        self.fd, self.watches = open_inotify(self.folders) or (None, {})
+
+    def sweep(self):
+        for folder in self.folders:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.is_file() and is_app_file(entry.name):
+                        self.pending.setdefault(entry.path, None)
+        self.last_sweep = time.monotonic()
+
+    def wait(self, timeout):
+        if self.last_sweep is None or time.monotonic() - self.last_sweep >= WATCH_SWEEP_INTERVAL:
+            self.sweep()
+        if self.fd is None:
+            time.sleep(timeout)
+            return
+        if select.select([self.fd], [], [], timeout)[0]:
+            data = os.read(self.fd, 64 * 1024)
+            offset = 0
+            while offset < len(data):
+                wd, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                name = os.fsdecode(data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + length].rstrip(b"\0"))
+                offset += INOTIFY_EVENT.size + length
+                if wd in self.watches and is_app_file(name):
+                    self.pending.setdefault(os.path.join(self.watches[wd], name), None)
+
+    def settled(self):
+        ready = []
+        now = time.time()
+        for path, last_size in list(self.pending.items()):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                del self.pending[path]
+                continue
+            if self.seen.get(path) == (stat.st_size, stat.st_mtime_ns):
+                del self.pending[path]
+            elif stat.st_size == last_size and now - stat.st_mtime >= self.debounce:
+                del self.pending[path]
+                self.seen[path] = (stat.st_size, stat.st_mtime_ns)
+                ready.append(path)
+            else:
+                self.pending[path] = stat.st_size
+        return ready
+
+    def retry(self, path):
+        # Hand the file out again on a later look
+        self.seen.pop(path, None)
+        self.pending.setdefault(path, None)
+
+def rolling_batch():
+    # The daemon adds to the newest batch of the current month and starts a new one when the month turns
+    month = datetime.datetime.now().strftime("%Y-%m")
+    rows = db_query("SELECT id FROM batches WHERE batch_date = ? ORDER BY id DESC LIMIT 1", (month,))
+    if not rows:
+        batch_id, batch_dir = create_batch()
+        return month, batch_id, batch_dir
+    batch_dir = os.path.join(REPORTS_BASE_DIR, f"batch_{rows[0][0]}")
+    os.makedirs(batch_dir, exist_ok=True)
+    return month, rows[0][0], batch_dir
+
+def already_scanned(file):
+    # store_scan caches every scanned binary, so a known MD5 means this exact file already has results
+    return bool(db_query("SELECT 1 FROM scan_cache WHERE file_hash = ?", (file_md5(file),)))
+
+def watch_folders(folders, pool, workers):
+    watcher = FolderWatcher(folders)
+    if watcher.fd is not None:
+        log("INFO", "Watching %s for new apps (inotify)", ", ".join(watcher.folders))
+    else:
+        log("INFO", "Watching %s for new apps (rescanning every %ds)", ", ".join(watcher.folders), WATCH_SWEEP_INTERVAL)
+    month = batch_id = batch_dir = None
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan-worker") as executor:
+        while True:
+            watcher.wait(1.0)
+            for file in watcher.settled():
+                if file in running.values():
+                    watcher.retry(file)
+                    continue
+                if USE_CACHE and already_scanned(file):
+                    log("DEBUG", "%s is unchanged since it was last scanned, skipping", file)
+                    continue
+                if month != datetime.datetime.now().strftime("%Y-%m"):
+                    month, batch_id, batch_dir = rolling_batch()
+                    LOG_CONTEXT["batch_id"] = batch_id
+                    metrics.set("mobsf_batch_id", batch_id)
+                    log("INFO", "Scanning watched apps into batch %d", batch_id)
+                log("INFO", "Detected new or changed app: %s", file)
+                metrics.inc("mobsf_apps_queued_total")
+                running[executor.submit(scan_worker, file, batch_id, batch_dir, pool)] = file
+
+            for future in [future for future in running if future.done()]:
+                file = running.pop(future)
+                try:
+                    succeeded = future.result()
+                except Exception as e:
+                    log("ERROR", "Worker crashed while processing %s: %s", file, e)
+                    succeeded = False
+                if succeeded:
+                    log("INFO", "Finished watched app %s", file)
+                else:
+                    log("WARNING", "Watched app %s failed; it is retried when the file changes", file)
 
 def main():
+    global MOBSF_HOST, MOBSF_API_KEY, USERNAME, PASSWORD, USE_CACHE, CACHE_VERSION
+
+    args = parse_args()
+    MOBSF_HOST = args.mobsf_host
+    MOBSF_API_KEY = args.mobsf_api_key
+    USERNAME = args.username
+    PASSWORD = args.password
+    USE_CACHE = not args.rescan
+    CACHE_VERSION = args.cache_version
+    setup_logging(args.log_level, args.log_format, args.log_max_bytes)
+
     try:
         log("INFO", "Starting scan process")
 
         # Check prerequisites
-        if len(sys.argv) != 5:
-            log("ERROR", "Usage: python script.py <MOBSF_HOST> <MOBSF_API_KEY>")
-            sys.exit(1)
 
         if not os.path.exists(DB_PATH):
-            log("ERROR", f"Database file not found: {DB_PATH}")
+            log("ERROR", "Database file not found: %s", DB_PATH)
             sys.exit(1)
+        ensure_schema()
 
-        # Login to MobSF
-        try:
-            session = login_to_mobsf(MOBSF_HOST, USERNAME, PASSWORD)
-            log("INFO", "Successfully logged in to MobSF")
-        except Exception as e:
-            log("ERROR", f"Failed to log in to MobSF: {e}")
+        if args.metrics_port:
+            try:
+                start_server(metrics, args.metrics_port, METRICS_HOST)
+                log("INFO", "Serving metrics on http://%s:%d/metrics", METRICS_HOST, args.metrics_port)
+            except OSError as e:
+                log("WARNING", "Could not serve metrics on port %d: %s", args.metrics_port, e)
+
+        # Login to every MobSF instance
+        instance_specs = [(MOBSF_HOST, MOBSF_API_KEY, USERNAME, PASSWORD)] + [tuple(i) for i in args.instance]
+        # The pipeline needs an app in every stage to keep them all busy
+        max_concurrency = sum(args.stage_workers_limits.values()) if args.pipeline else args.workers
+        instances = login_instances(instance_specs, max_concurrency, args.fresh_login)
+        if not instances:
+            log("ERROR", "Failed to log in to MobSF")
             sys.exit(1)
+        pool = InstancePool(instances)
+        metrics.collect(pool.collect_metrics)
 
-        # Create new batch and get batch info
-        batch_id, batch_dir = create_batch()
-        log("INFO", f"Created new batch with ID: {batch_id}")
-
-        # Process files
-        scan_count = 0
-        error_count = 0
-        for file in os.listdir(SCAN_DIR):
-            if file.endswith(".ipa") or file.endswith(".apk"):
-                if process_app(os.path.join(SCAN_DIR, file), batch_id, batch_dir, session):  # Pass session here
-                    scan_count += 1
-                else:
-                    error_count += 1
+        if args.watch:
+            # Stop on SIGTERM the same way as on Ctrl+C, after in-flight scans are stored
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+            started = time.monotonic()
+            try:
+                watch_folders(WATCH_DIRS, pool, args.workers)
+            except KeyboardInterrupt:
+                log("INFO", "Stopping watch mode")
+            finally:
+                write_run_summary(LOG_CONTEXT["batch_id"], "watch", args.workers, time.monotonic() - started)
+            sys.exit(0)
 
-        log("INFO", f"Scan process complete. Successful: {scan_count}, Failed: {error_count}")
+        # Create new batch, or pick up the one being resumed
+        progress = {}
+        if args.resume:
+            if not db_query("SELECT id FROM batches WHERE id = ?", (args.resume,)):
+                log("ERROR", "Batch %d not found, nothing to resume", args.resume)
+                sys.exit(1)
+            batch_id = args.resume
+            batch_dir = os.path.join(REPORTS_BASE_DIR, f"batch_{batch_id}")
+            os.makedirs(batch_dir, exist_ok=True)
+            progress = load_progress(batch_id)
+            log("INFO", "Resuming batch with ID: %d", batch_id)
+        else:
+            batch_id, batch_dir = create_batch()
+            log("INFO", "Created new batch with ID: %d", batch_id)
+        LOG_CONTEXT["batch_id"] = batch_id
+        metrics.set("mobsf_batch_id", batch_id)
+
+        # Process files, skipping any the resumed batch already stored
+        files = [
+            os.path.join(SCAN_DIR, file)
+            for file in os.listdir(SCAN_DIR)
+            if file.endswith(".ipa") or file.endswith(".apk")
+        ]
+        finished = [file for file in files if progress.get(file, {}).get("stage") == STAGES[-1][0]]
+        files = [file for file in files if file not in finished]
+        if finished:
+            log("INFO", "Skipping %d apps already completed in batch %d", len(finished), batch_id)
+
+        # Read bundle ids and versions from the binaries before anything is uploaded
+        with ThreadPoolExecutor(max_workers=max(args.workers, 4), thread_name_prefix="inspect") as executor:
+            list(executor.map(local_metadata, files))
+        known = scanned_versions(files)
+        skipped = []
+        if known and args.skip_scanned_versions:
+            files = [file for file in files if file not in known]
+            skipped = sorted(known)
+            log("INFO", "Skipping %d apps whose bundle id and version were already scanned", len(skipped))
+            for file in skipped:
+                log("INFO", "Skipped %s: version already scanned", os.path.basename(file))
+        elif known:
+            log("INFO", "%d apps have a bundle id and version that was already scanned; they go last", len(known))
+
+        # The pipeline's throughput is bounded by its MobSF-side scan stage
+        workers = args.stage_workers_limits["scan"] if args.pipeline else args.workers
+        files, predicted = schedule_files(files, workers, known, progress)
+        metrics.inc("mobsf_apps_queued_total", len(files))
+        started = time.monotonic()
+        if args.pipeline:
+            scan_count, error_count = run_pipeline(files, batch_id, batch_dir, pool, args.stage_workers_limits, progress)
+        else:
+            scan_count, error_count = scan_files(files, batch_id, batch_dir, pool, args.workers, progress)
+        scan_count += len(finished)
+        makespan = time.monotonic() - started
+        if predicted:
+            log("INFO", "Batch makespan %.1fs, predicted %.1fs (%+.0f%%)",
+                makespan, predicted, (makespan - predicted) / predicted * 100)
+        else:
+            log("INFO", "Batch makespan %.1fs, predicted %.1fs", makespan, predicted)
+        write_run_summary(batch_id, "pipeline" if args.pipeline else "workers", workers, makespan, predicted)
 
-        # Exit with error if no apps were successfully scanned
+        log("INFO", "Scan process complete. Successful: %d, Failed: %d, Skipped: %d", scan_count, error_count, len(skipped))
+
+        # Exit with error if no apps were successfully scanned; skipped apps have no row in this batch
         if scan_count == 0:
             log("ERROR", "No apps were successfully scanned")
             sys.exit(4)
         
         # Exit with error if there were any failed scans
         if error_count > 0:
-            log("WARNING", f"{error_count} apps failed to scan")
+            log("WARNING", "%d apps failed to scan", error_count)
             sys.exit(5)
 
         # Everything completed successfully
         sys.exit(0)
 
     except Exception as e:
-        log("ERROR", f"Unexpected error in main: {e}")
+        log("ERROR", "Unexpected error in main: %s", e)
         sys.exit(6)
+    finally:
+        close_db_writer()
+        shutdown_logging()
 
 if __name__ == "__main__":
     main()